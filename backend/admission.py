@@ -0,0 +1,178 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Depends, HTTPException, status
+from auth import verify_token
+from metrics import ADMISSION_QUEUE_SECONDS, ADMISSION_REJECTIONS
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# LLM-backed requests served at once across all users, and how many more may wait for a slot
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "15"))
+# Request budgets in cost units per minute; 0 disables the bucket
+GLOBAL_REQUESTS_PER_MINUTE = float(os.getenv("GLOBAL_REQUESTS_PER_MINUTE", "1200"))
+GLOBAL_BURST = int(os.getenv("GLOBAL_BURST", "200"))
+USER_REQUESTS_PER_MINUTE = float(os.getenv("USER_REQUESTS_PER_MINUTE", "60"))
+USER_BURST = int(os.getenv("USER_BURST", "40"))
+# Requests one user may have running or queued at once; 0 disables the quota
+USER_MAX_CONCURRENT = int(os.getenv("USER_MAX_CONCURRENT", "4"))
+ADMISSION_MAX_USERS = 10000
+
+# Lower numbers are served first when requests queue; cost is charged against the token buckets
+ADMISSION_PRIORITIES = {"ask": 0, "generate": 1, "lesson": 2, "export": 3, "batch": 4}
+# A batch request is charged again for every document it generates, and a job request for the generations it queues
+ADMISSION_COSTS = {"ask": 1, "generate": 1, "lesson": 3, "export": 2, "batch": 1, "batch_document": 2}
+
+def _reject(status_code: int, reason: str, retry_after: float, detail: str) -> HTTPException:
+    ADMISSION_REJECTIONS.inc(reason=reason)
+    return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+class AdmissionController:
+    """Per-user and global token buckets in front of a bounded priority queue of LLM request slots"""
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+                 global_requests_per_minute: float = GLOBAL_REQUESTS_PER_MINUTE, global_burst: int = GLOBAL_BURST,
+                 user_requests_per_minute: float = USER_REQUESTS_PER_MINUTE, user_burst: int = USER_BURST,
+                 user_max_concurrent: int = USER_MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_requests_per_minute = user_requests_per_minute
+        self.user_burst = user_burst
+        self.user_max_concurrent = user_max_concurrent
+        self._global_bucket = (
+            TokenBucket(global_requests_per_minute / 60, global_burst) if global_requests_per_minute > 0 else None
+        )
+        self._user_buckets = OrderedDict()
+        self._user_active = {}
+        self._active = 0
+        # (priority, arrival order, future) of requests waiting for a slot
+        self._waiters = []
+        self._arrivals = itertools.count()
+        self._lock = threading.Lock()
+
+    def _user_bucket(self, user_email: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._user_buckets.get(user_email)
+            if bucket is None:
+                bucket = TokenBucket(self.user_requests_per_minute / 60, self.user_burst)
+                self._user_buckets[user_email] = bucket
+                while len(self._user_buckets) > ADMISSION_MAX_USERS:
+                    self._user_buckets.popitem(last=False)
+            self._user_buckets.move_to_end(user_email)
+            return bucket
+
+    def _check_budgets(self, user_email: str, kind: str):
+        if self.user_max_concurrent and self._user_active.get(user_email, 0) >= self.user_max_concurrent:
+            raise _reject(
+                status.HTTP_429_TOO_MANY_REQUESTS, "user_concurrency", 1,
+                "Too many requests in progress. Please wait for them to finish."
+            )
+        self._take_budget(user_email, ADMISSION_COSTS[kind])
+
+    def _take_budget(self, user_email: str, cost: float):
+        if self.user_requests_per_minute > 0:
+            wait = self._user_bucket(user_email).try_acquire(cost)
+            if wait:
+                raise _reject(status.HTTP_429_TOO_MANY_REQUESTS, "user_rate", wait, "Too many requests. Please slow down.")
+        if self._global_bucket is not None:
+            wait = self._global_bucket.try_acquire(cost)
+            if wait:
+                raise _reject(status.HTTP_503_SERVICE_UNAVAILABLE, "global_rate", wait, "Server is busy. Please retry shortly.")
+
+    def _charged_buckets(self, user_email: str):
+        buckets = []
+        if self.user_requests_per_minute > 0:
+            buckets.append(self._user_bucket(user_email))
+        if self._global_bucket is not None:
+            buckets.append(self._global_bucket)
+        return buckets
+
+    async def charge(self, user_email: str, kind: str):
+        """Wait until the user's and the global budgets cover LLM work that runs outside a request slot"""
+        cost = ADMISSION_COSTS[kind]
+        for bucket in self._charged_buckets(user_email):
+            wait = bucket.try_acquire(cost)
+            while wait:
+                await asyncio.sleep(wait)
+                wait = bucket.try_acquire(cost)
+
+    def spend(self, user_email: str, kind: str, units: int = 1):
+        """Charge LLM work that will run later in the background now, or raise 429/503 with Retry-After"""
+        self._take_budget(user_email, ADMISSION_COSTS[kind] * units)
+
+    async def acquire(self, user_email: str, kind: str):
+        """Wait for an LLM request slot, or raise 429/503 with Retry-After when over budget or saturated"""
+        self._check_budgets(user_email, kind)
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self._user_active[user_email] = self._user_active.get(user_email, 0) + 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise _reject(status.HTTP_503_SERVICE_UNAVAILABLE, "queue_full", self.queue_timeout, "Server is busy. Please retry shortly.")
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (ADMISSION_PRIORITIES[kind], next(self._arrivals), future))
+        # Queued requests count towards the user's quota so one user can't fill the queue
+        self._user_active[user_email] = self._user_active.get(user_email, 0) + 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait({future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # The client went away; give back a slot granted at the same moment
+            if future.done():
+                self.release(user_email)
+            else:
+                future.cancel()
+                self._forget(user_email)
+            raise
+        finally:
+            ADMISSION_QUEUE_SECONDS.observe(time.perf_counter() - started, kind=kind)
+        if not future.done():
+            future.cancel()
+            self._forget(user_email)
+            raise _reject(status.HTTP_503_SERVICE_UNAVAILABLE, "queue_timeout", self.queue_timeout, "Server is busy. Please retry shortly.")
+
+    def _forget(self, user_email: str):
+        remaining = self._user_active.get(user_email, 1) - 1
+        if remaining:
+            self._user_active[user_email] = remaining
+        else:
+            self._user_active.pop(user_email, None)
+
+    def release(self, user_email: str):
+        """Free a slot and hand it to the highest priority waiter"""
+        self._active -= 1
+        self._forget(user_email)
+        while self._waiters and self._active < self.max_concurrent:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+
+admission_controller = AdmissionController()
+
+def admit(kind: str):
+    """Dependency that authenticates the user and holds an admission slot until the response is sent"""
+    async def dependency(current_user=Depends(verify_token)):
+        user_email = current_user["email"]
+        controller = admission_controller
+        await controller.acquire(user_email, kind)
+        try:
+            yield current_user
+        finally:
+            controller.release(user_email)
+    return dependency
+
+def spend(user_email: str, kind: str, units: int = 1):
+    """Charge a user for background LLM work when it is queued"""
+    admission_controller.spend(user_email, kind, units)
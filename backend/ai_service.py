@@ -1,36 +1,441 @@
 import os
+import json
 import logging
-from typing import List
-from models import QuizQuestion
-from pydantic import BaseModel
-
-# Gemini integration
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
+import re
+import threading
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+from models import QuizQuestion, Flashcard, DeckSlide
+from cache_service import generation_cache, make_cache_key
+from chunking import split_into_chunks, needs_chunking
+from rate_limit import TokenBucket
+from llm_router import LLMRouter, Backend
+from metrics import (
+    LLM_CALL_SECONDS, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS, LLM_ERRORS, LLM_MOCK_FALLBACKS,
+    QUIZ_PARSE_SECONDS, timed, timed_call
+)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-pro")
+# Models the router fails over and hedges to, in order, when the primary is slow or failing
+GEMINI_FALLBACK_MODELS = [name.strip() for name in os.getenv("GEMINI_FALLBACK_MODELS", "").split(",") if name.strip()]
+# Native JSON output needs gemini-1.5 or newer
+GEMINI_JSON_MODE = os.getenv("GEMINI_JSON_MODE", "false").lower() == "true"
 logger = logging.getLogger(__name__)
 if not GEMINI_API_KEY:
     logger.error("GEMINI_API_KEY not found in environment variables.")
-if genai and GEMINI_API_KEY:
+
+# The Gemini client is created on first use (or by the startup warm-up) rather than at import,
+# since google.generativeai takes most of a second to import. Tests and benchmarks assign stubs here.
+_NOT_LOADED = object()
+gemini_model = _NOT_LOADED
+_model_lock = threading.Lock()
+
+def _load_model():
+    if not GEMINI_API_KEY:
+        return None
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        logger.error("google-generativeai package not imported.")
+        return None
     try:
         genai.configure(api_key=GEMINI_API_KEY)
-        gemini_model = genai.GenerativeModel("gemini-pro")
+        model = LLMRouter([
+            Backend(name, genai.GenerativeModel(name)) for name in [GEMINI_MODEL_NAME] + GEMINI_FALLBACK_MODELS
+        ])
         logger.info("Gemini model loaded successfully.")
+        return model
     except Exception as e:
         logger.error(f"Error initializing Gemini model: {e}")
-        gemini_model = None
-else:
-    if not genai:
-        logger.error("google-generativeai package not imported.")
-    gemini_model = None
+        return None
+
+def get_model():
+    """Return the Gemini client, or None when unavailable, creating it on first use"""
+    global gemini_model
+    if gemini_model is _NOT_LOADED:
+        with _model_lock:
+            if gemini_model is _NOT_LOADED:
+                gemini_model = _load_model()
+    return gemini_model
+
+# Provider quota shared by every caller in the process; 0 disables the limit
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "5"))
+gemini_rate_limiter = (
+    TokenBucket(GEMINI_REQUESTS_PER_MINUTE / 60, GEMINI_BURST) if GEMINI_REQUESTS_PER_MINUTE > 0 else None
+)
+
+SUMMARY_PROMPT = "Create 5 bullet point summary from this content:\n\n{content}"
+QUIZ_SCHEMA = '[{"question": str, "options": [4 strings], "correct_answer": "A"|"B"|"C"|"D"}]'
+QUIZ_PROMPT = (
+    "Create {count} multiple choice questions with 4 options each based on the content. "
+    "Respond with a JSON array only, no markdown, matching this schema: " + QUIZ_SCHEMA.replace("{", "{{").replace("}", "}}") +
+    "\n\n{content}"
+)
+QUIZ_FOLLOWUP_PROMPT = (
+    "Create {count} more multiple choice questions with 4 options each based on the content. "
+    "Do not repeat or rephrase any of these existing questions:\n{existing}\n"
+    "Respond with a JSON array only, no markdown, matching this schema: " + QUIZ_SCHEMA.replace("{", "{{").replace("}", "}}") +
+    "\n\n{content}"
+)
+CHUNK_SUMMARY_PROMPT = "Create 5 bullet point summary of this section of a longer document:\n\n{content}"
+REDUCE_SUMMARY_PROMPT = (
+    "These bullet points summarize consecutive sections of one document. "
+    "Merge them into a 5 bullet point summary of the whole document:\n\n{content}"
+)
+ANSWER_PROMPT = "Content: {content}\n\nStudent Question: {question}\n\nAnswer:"
+FLASHCARD_SCHEMA = '[{"front": term or question, "back": definition or answer}]'
+FLASHCARD_PROMPT = (
+    "Create {count} flashcards covering the key terms and facts in the content. "
+    "Each card should test a different idea, with a short front and a one or two sentence back. "
+    "Respond with a JSON array only, no markdown, matching this schema: " +
+    FLASHCARD_SCHEMA.replace("{", "{{").replace("}", "}}") + "\n\n{content}"
+)
+LESSON_PROMPT = (
+    "Create a lesson from the content below. Respond with a single JSON object only, no markdown, "
+    "matching this schema:\n"
+    '{{"summary": [5 bullet point strings], '
+    '"quiz": [15 objects {{"question": str, "options": [4 strings], "correct_answer": "A"|"B"|"C"|"D"}}], '
+    '"flashcards": [10 objects {{"front": term, "back": definition}}]'
+    "{deck_schema}}}"
+    "\n\nContent:\n{content}"
+)
+LESSON_DECK_SCHEMA = ', "deck": [5 to 8 slide objects {"title": str, "bullets": [3 to 5 strings]}]'
+
+# Metric label for each prompt
+PROMPT_OPERATIONS = {
+    SUMMARY_PROMPT: "summary",
+    QUIZ_PROMPT: "quiz",
+    QUIZ_FOLLOWUP_PROMPT: "quiz_followup",
+    CHUNK_SUMMARY_PROMPT: "chunk_summary",
+    REDUCE_SUMMARY_PROMPT: "reduce_summary",
+    ANSWER_PROMPT: "answer",
+    FLASHCARD_PROMPT: "flashcards",
+    LESSON_PROMPT: "lesson",
+}
+
+def _call_model(operation: str, prompt: str, **kwargs) -> str:
+    """Call Gemini and record latency, prompt and response size, and errors"""
+    if gemini_rate_limiter:
+        gemini_rate_limiter.acquire()
+    LLM_PROMPT_CHARS.observe(len(prompt), operation=operation)
+    try:
+        with timed(LLM_CALL_SECONDS, "llm", operation=operation):
+            text = get_model().generate_content(prompt, **kwargs).text
+    except Exception:
+        LLM_ERRORS.inc(operation=operation)
+        raise
+    LLM_RESPONSE_CHARS.observe(len(text), operation=operation)
+    return text
+
+def _stream_model(operation: str, prompt: str) -> Iterator[str]:
+    """Stream from Gemini, recording the same metrics as _call_model once the stream ends"""
+    if gemini_rate_limiter:
+        gemini_rate_limiter.acquire()
+    LLM_PROMPT_CHARS.observe(len(prompt), operation=operation)
+    size = 0
+    try:
+        with timed(LLM_CALL_SECONDS, "llm", operation=operation):
+            for chunk in get_model().generate_content(prompt, stream=True):
+                size += len(chunk.text)
+                yield chunk.text
+    except Exception:
+        LLM_ERRORS.inc(operation=operation)
+        raise
+    LLM_RESPONSE_CHARS.observe(size, operation=operation)
+
+def _cache_key(prompt_template: str, content: str, **template_args) -> str:
+    return make_cache_key(content, prompt_template.format(content="", **template_args), GEMINI_MODEL_NAME)
+
+# (document content, near-duplicate source content) for the current request
+_reused_source: ContextVar[Optional[Tuple[str, str]]] = ContextVar("reused_source", default=None)
+
+def reuse_generations_from(content: str, source_content: str):
+    """Serve cache misses for a document's content from generations cached for its near-duplicate source"""
+    _reused_source.set((content, source_content) if source_content != content else None)
+
+def _cached_generation(prompt_template: str, content: str, **template_args) -> Optional[str]:
+    cached = generation_cache.get(_cache_key(prompt_template, content, **template_args))
+    if cached is None:
+        reused = _reused_source.get()
+        if reused is not None and reused[0] == content:
+            cached = generation_cache.get(_cache_key(prompt_template, reused[1], **template_args))
+    return cached
+
+def generate_cached(prompt_template: str, content: str, json_mode: bool = False,
+                    parse: Optional[Callable[[str], Any]] = None, **template_args) -> Any:
+    """Return model output for a prompt, reusing cached generations for identical content.
+
+    With parse, return the parsed output and only cache responses that parse to something.
+    """
+    cached = _cached_generation(prompt_template, content, **template_args)
+    if cached is not None:
+        return parse(cached) if parse else cached
+    key = _cache_key(prompt_template, content, **template_args)
+    prompt = prompt_template.format(content=content, **template_args)
+    operation = PROMPT_OPERATIONS.get(prompt_template, "generate")
+    if json_mode and GEMINI_JSON_MODE:
+        text = _call_model(operation, prompt, generation_config={"response_mime_type": "application/json"})
+    else:
+        text = _call_model(operation, prompt)
+    if parse is None:
+        generation_cache.set(key, text)
+        return text
+    # A parse failure raises before caching, so the next request asks the model again
+    parsed = parse(text)
+    if parsed:
+        generation_cache.set(key, text)
+    return parsed
+
+SUMMARY_POINTS = 5
+QUIZ_QUESTIONS = 15
+FLASHCARD_COUNT = 10
+# Cards whose fronts share at least this fraction of words are treated as duplicates
+FLASHCARD_SIMILARITY = float(os.getenv("FLASHCARD_SIMILARITY", "0.8"))
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", "4"))
+# Shared by every request so chunk calls stay bounded across the whole process
+_map_executor = ThreadPoolExecutor(max_workers=MAP_CONCURRENCY, thread_name_prefix="ai-map")
+
+def generation_waves(content: str, max_chunks: Optional[int] = None) -> int:
+    """Sequential rounds of model calls a generation makes, for sizing its timeout"""
+    if not needs_chunking(content):
+        return 1
+    chunks = len(split_into_chunks(content))
+    if max_chunks is not None:
+        chunks = min(chunks, max_chunks)
+    # Map calls run MAP_CONCURRENCY at a time, then one reduce or follow-up call
+    return -(-chunks // MAP_CONCURRENCY) + 1
+
+def _map_chunks(func, chunks: list) -> list:
+    """Run func over chunks in parallel, dropping chunks that fail"""
+    futures = [_map_executor.submit(func, chunk) for chunk in chunks]
+    results = []
+    for i, future in enumerate(futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.error(f"Chunk {i+1}/{len(chunks)} failed: {e}")
+            results.append(None)
+    if all(result is None for result in results):
+        raise RuntimeError("Every chunk failed to generate")
+    return results
+
+def _parse_bullets(text: str) -> List[str]:
+    return [line.strip().lstrip('•-* ') for line in text.split('\n') if line.strip()]
+
+def _json_objects(text: str) -> Iterator[dict]:
+    """Yield every JSON object in text that parses, in one pass over the characters.
+
+    Tolerates markdown fences, prose around the JSON, missing commas and a truncated tail.
+    """
+    starts = []
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            starts.append(i)
+        elif char == "}" and starts:
+            start = starts.pop()
+            try:
+                value = json.loads(text[start:i + 1])
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                yield value
+
+_question_line_re = re.compile(r"^(?:\*\*)?(?:Q(?:uestion)?\s*\d*\s*[:.)]|\d+[.)])\s*(.+?)(?:\*\*)?$", re.IGNORECASE)
+_option_line_re = re.compile(r"^\(?([A-Da-d])[).:]\s*(.+)$")
+_option_prefix_re = re.compile(r"^\(?[A-D]\)\s+")
+_answer_line_re = re.compile(r"^(?:\*\*)?(?:Correct(?:\s+answer)?|Answer)\s*[:\-]\s*(?:\*\*)?\(?([A-Da-d])\b", re.IGNORECASE)
+
+def _parse_quiz_lines(text: str) -> List[QuizQuestion]:
+    """Parse the plain "Q: / A) / Correct:" layout line by line"""
+    questions = []
+    question, options, answer = None, [], None
+
+    def flush():
+        if question and len(options) == 4 and answer is not None and answer < 4:
+            questions.append(QuizQuestion(question=question, options=list(options), correct_answer=options[answer]))
+
+    for raw in text.split("\n"):
+        line = raw.strip()
+        if line.startswith(("- ", "* ")):
+            line = line[2:].strip()
+        if not line:
+            continue
+        answer_match = _answer_line_re.match(line)
+        if answer_match:
+            answer = ord(answer_match.group(1).upper()) - 65
+            continue
+        option_match = _option_line_re.match(line)
+        if option_match and question is not None and len(options) < 4:
+            options.append(option_match.group(2).strip())
+            continue
+        question_match = _question_line_re.match(line)
+        if question_match:
+            flush()
+            question, options, answer = question_match.group(1).strip(), [], None
+    flush()
+    return questions
+
+@timed_call(QUIZ_PARSE_SECONDS, "quiz_parse")
+def _parse_quiz(quiz_text: str) -> List[QuizQuestion]:
+    """Parse quiz output, preferring JSON question objects and falling back to the line layout"""
+    questions = _quiz_from_json(obj for obj in _json_objects(quiz_text) if "question" in obj)
+    return questions or _parse_quiz_lines(quiz_text)
+
+def _dedupe_questions(questions: List[QuizQuestion]) -> List[QuizQuestion]:
+    seen = set()
+    unique = []
+    for question in questions:
+        key = " ".join(question.question.lower().split())
+        if key not in seen:
+            seen.add(key)
+            unique.append(question)
+    return unique
+
+_card_line_re = re.compile(r"^(?:\*\*)?(Term|Front|Q(?:uestion)?|Definition|Back|A(?:nswer)?)\s*(?:\*\*)?\s*:\s*(?:\*\*)?\s*(.+)$", re.IGNORECASE)
+# Unicode word characters, so fronts in scripts like CJK, Devanagari or Arabic still tokenize
+_word_re = re.compile(r"\w+")
+_card_stopwords = {"a", "an", "the", "of", "is", "what", "define", "definition"}
+
+def _flashcards_from_json(items: Iterable[dict]) -> List[Flashcard]:
+    cards = []
+    for item in items:
+        front = str(item.get("front", item.get("term", ""))).strip()
+        back = str(item.get("back", item.get("definition", ""))).strip()
+        if front and back:
+            cards.append(Flashcard(front=front, back=back))
+    return cards
+
+def _parse_flashcard_lines(text: str) -> List[Flashcard]:
+    """Parse the plain "Term: / Definition:" layout line by line"""
+    cards = []
+    front = None
+    for raw in text.split("\n"):
+        match = _card_line_re.match(raw.strip().lstrip("-* "))
+        if not match:
+            continue
+        label, value = match.group(1).lower(), match.group(2).strip().rstrip("*").strip()
+        if label in ("term", "front", "q", "question"):
+            front = value
+        elif front:
+            cards.append(Flashcard(front=front, back=value))
+            front = None
+    return cards
+
+def _parse_flashcards(text: str) -> List[Flashcard]:
+    """Parse flashcard output, preferring JSON card objects and falling back to the line layout"""
+    cards = _flashcards_from_json(
+        obj for obj in _json_objects(text) if ("front" in obj or "term" in obj)
+    )
+    return cards or _parse_flashcard_lines(text)
+
+def _card_words(front: str) -> frozenset:
+    front = front.casefold()
+    words = frozenset(word for word in _word_re.findall(front) if word not in _card_stopwords)
+    # Fronts made only of filler words or symbols are compared whole
+    return words or frozenset([" ".join(front.split())] if front.strip() else [])
+
+def _dedupe_flashcards(cards: List[Flashcard]) -> List[Flashcard]:
+    """Drop cards whose front repeats an earlier card's, ignoring case, punctuation and filler words"""
+    unique, kept_words = [], []
+    for card in cards:
+        words = _card_words(card.front)
+        if not words:
+            continue
+        if any(len(words & other) / len(words | other) >= FLASHCARD_SIMILARITY for other in kept_words):
+            continue
+        kept_words.append(words)
+        unique.append(card)
+    return unique
+
+def _fill_missing_questions(content: str, questions: List[QuizQuestion]) -> List[QuizQuestion]:
+    """Ask the model for just the questions that are missing instead of padding the quiz"""
+    missing = QUIZ_QUESTIONS - len(questions)
+    if missing <= 0:
+        return questions[:QUIZ_QUESTIONS]
+    logger.info(f"Quiz is {missing} questions short, requesting the rest")
+    try:
+        extra = generate_cached(
+            QUIZ_FOLLOWUP_PROMPT, content, json_mode=True, parse=_parse_quiz, count=missing,
+            existing="\n".join(f"- {q.question}" for q in questions)
+        )
+    except Exception as e:
+        logger.error(f"Quiz follow-up failed: {e}")
+        return questions
+    return _dedupe_questions(questions + extra)[:QUIZ_QUESTIONS]
+
+def _summarize_chunked(content: str) -> List[str]:
+    """Map: summarize each chunk in parallel. Reduce: merge the bullets into one summary"""
+    chunks = split_into_chunks(content)
+    partials = _map_chunks(lambda chunk: generate_cached(CHUNK_SUMMARY_PROMPT, chunk, parse=_parse_bullets), chunks)
+    merged = "\n".join(f"- {point}" for bullets in partials if bullets for point in bullets)
+    return generate_cached(REDUCE_SUMMARY_PROMPT, merged, parse=_parse_bullets)
+
+def _spread_chunks(chunks: List[str], count: int) -> List[str]:
+    """At most count chunks, evenly spaced across the document"""
+    if len(chunks) <= count:
+        return chunks
+    # Each selected chunk contributes at least one item, so more map calls would only be discarded
+    return [chunks[i * len(chunks) // count] for i in range(count)]
+
+def _quiz_chunked(content: str) -> List[QuizQuestion]:
+    """Map: ask each chunk for its share of questions. Reduce: interleave them across chunks"""
+    chunks = _spread_chunks(split_into_chunks(content), QUIZ_QUESTIONS)
+    # Round the chunk count down to a power of two so the per-chunk prompt, and with it the
+    # cached questions of unchanged chunks, survives edits that add or remove a chunk
+    per_chunk = -(-QUIZ_QUESTIONS // (1 << (len(chunks).bit_length() - 1)))
+    partials = _map_chunks(
+        lambda chunk: generate_cached(QUIZ_PROMPT, chunk, json_mode=True, parse=_parse_quiz, count=per_chunk), chunks
+    )
+    # Round-robin so the final quiz covers the whole document, not just its start
+    pools = [list(questions) for questions in partials if questions]
+    questions, seen = [], set()
+    while pools and len(questions) < QUIZ_QUESTIONS:
+        for pool in pools:
+            question = pool.pop(0)
+            if question.question.lower() not in seen:
+                seen.add(question.question.lower())
+                questions.append(question)
+        pools = [pool for pool in pools if pool]
+    if len(questions) < QUIZ_QUESTIONS:
+        # Top up from the chunk that yielded the fewest questions
+        weakest = min(range(len(chunks)), key=lambda i: len(partials[i] or []))
+        questions = _fill_missing_questions(chunks[weakest], questions)
+    return questions[:QUIZ_QUESTIONS]
+
+def _flashcards_chunked(content: str) -> List[Flashcard]:
+    """Map: ask each chunk for its share of cards. Reduce: interleave them across chunks"""
+    chunks = _spread_chunks(split_into_chunks(content), FLASHCARD_COUNT)
+    per_chunk = -(-FLASHCARD_COUNT // (1 << (len(chunks).bit_length() - 1)))
+    partials = _map_chunks(
+        lambda chunk: generate_cached(FLASHCARD_PROMPT, chunk, json_mode=True, parse=_parse_flashcards, count=per_chunk),
+        chunks
+    )
+    pools = [list(cards) for cards in partials if cards]
+    interleaved = []
+    while pools:
+        for pool in pools:
+            interleaved.append(pool.pop(0))
+        pools = [pool for pool in pools if pool]
+    return _dedupe_flashcards(interleaved)
 
 def generate_summary(content: str) -> List[str]:
     """Generate bullet point summary using Gemini"""
-    if not gemini_model:
+    if not get_model():
         # Mock response when no Gemini model
+        LLM_MOCK_FALLBACKS.inc(operation="summary", reason="no_model")
         return [
             "Key concept 1: Main topic overview and importance",
             "Key concept 2: Supporting details and examples",
@@ -40,14 +445,15 @@ def generate_summary(content: str) -> List[str]:
         ]
     
     try:
-        prompt = f"Create 5 bullet point summary from this content:\n\n{content}"
-        response = gemini_model.generate_content(prompt)
-        summary_text = response.text
-        bullets = [line.strip().lstrip('•-* ') for line in summary_text.split('\n') if line.strip()]
-        return bullets[:5]  # Return max 5 bullets
+        if needs_chunking(content):
+            bullets = _summarize_chunked(content)
+        else:
+            bullets = generate_cached(SUMMARY_PROMPT, content, parse=_parse_bullets)
+        return bullets[:SUMMARY_POINTS]  # Return max 5 bullets
         
     except Exception as e:
         # Fallback to mock on error
+        LLM_MOCK_FALLBACKS.inc(operation="summary", reason="error")
         return [
             "Summary generation failed - using mock data",
             "Point 1: Key concepts from the uploaded content",
@@ -57,9 +463,10 @@ def generate_summary(content: str) -> List[str]:
         ]
 
 def generate_quiz(content: str) -> List[QuizQuestion]:
-    """Generate at least 15 quiz questions using Gemini"""
-    if not gemini_model:
+    """Generate up to 15 quiz questions using Gemini"""
+    if not get_model():
         # Always return 15 mock questions
+        LLM_MOCK_FALLBACKS.inc(operation="quiz", reason="no_model")
         return [
             QuizQuestion(
                 question=f"Mock Question {i+1}",
@@ -68,44 +475,16 @@ def generate_quiz(content: str) -> List[QuizQuestion]:
             ) for i in range(15)
         ]
     try:
-        prompt = (
-            "Create 15 multiple choice questions with 4 options each based on the content. "
-            "Format as: Q: question\nA) option1\nB) option2\nC) option3\nD) option4\nCorrect: A\nRepeat for each question."
-        )
-        response = gemini_model.generate_content(f"{prompt}\n\n{content}")
-        quiz_text = response.text
-        # Parse Gemini response
-        questions = []
-        blocks = quiz_text.split('Q: ')[1:]
-        for block in blocks:
-            lines = block.strip().split('\n')
-            q = lines[0].strip()
-            opts = []
-            correct = None
-            for line in lines[1:]:
-                if line.startswith(('A)', 'B)', 'C)', 'D)')):
-                    opts.append(line[3:].strip())
-                elif line.startswith('Correct:'):
-                    correct_letter = line.split(':')[1].strip()
-                    idx = ord(correct_letter.upper()) - 65
-                    if 0 <= idx < len(opts):
-                        correct = opts[idx]
-            if q and len(opts) == 4 and correct:
-                questions.append(QuizQuestion(
-                    question=q,
-                    options=opts,
-                    correct_answer=correct
-                ))
-        # Fallback to mock if parsing fails
-        if len(questions) < 15:
-            while len(questions) < 15:
-                questions.append(QuizQuestion(
-                    question=f"Gemini Generated Question {len(questions)+1}",
-                    options=[f"Answer {chr(65+j)}" for j in range(4)],
-                    correct_answer=f"Answer {chr(65+(len(questions)%4))}"
-                ))
-        return questions[:15]
+        if needs_chunking(content):
+            questions = _quiz_chunked(content)
+        else:
+            questions = generate_cached(QUIZ_PROMPT, content, json_mode=True, parse=_parse_quiz, count=QUIZ_QUESTIONS)
+            questions = _fill_missing_questions(content, _dedupe_questions(questions))
+        if not questions:
+            raise ValueError("Model returned no usable questions")
+        return questions
     except Exception as e:
+        LLM_MOCK_FALLBACKS.inc(operation="quiz", reason="error")
         return [
             QuizQuestion(
                 question=f"Gemini quiz error: {str(e)}",
@@ -114,34 +493,135 @@ def generate_quiz(content: str) -> List[QuizQuestion]:
             )
         ]
 
-# Flashcard model and generator
-class Flashcard(BaseModel):
-    front: str
-    back: str
-
 def generate_flashcards(content: str) -> List[Flashcard]:
-    """Generate flashcards using Gemini"""
-    if not gemini_model:
+    """Generate up to 10 deduplicated flashcards using Gemini"""
+    if not get_model():
         # Mock flashcards
+        LLM_MOCK_FALLBACKS.inc(operation="flashcards", reason="no_model")
         return [
-            Flashcard(front=f"Term {i+1}", back=f"Definition {i+1}") for i in range(10)
+            Flashcard(front=f"Term {i+1}", back=f"Definition {i+1}") for i in range(FLASHCARD_COUNT)
         ]
     try:
-        prompt = f"Create 10 flashcards from the content. Format as: Term: ...\nDefinition: ..."
-        response = gemini_model.generate_content(prompt)
-        flashcard_text = response.text
-        # For demo, return mock data
-        return [Flashcard(front=f"Gemini Term {i+1}", back=f"Gemini Definition {i+1}") for i in range(10)]
+        if needs_chunking(content):
+            cards = _flashcards_chunked(content)
+        else:
+            cards = _dedupe_flashcards(
+                generate_cached(FLASHCARD_PROMPT, content, json_mode=True, parse=_parse_flashcards, count=FLASHCARD_COUNT)
+            )
+        if not cards:
+            raise ValueError("Model returned no usable flashcards")
+        return cards[:FLASHCARD_COUNT]
     except Exception as e:
+        LLM_MOCK_FALLBACKS.inc(operation="flashcards", reason="error")
         return [Flashcard(front=f"Gemini flashcard error: {str(e)}", back="Error")]
 
 def answer_question(content: str, question: str) -> str:
     """Answer student question using Gemini"""
-    if not gemini_model:
+    if not get_model():
+        LLM_MOCK_FALLBACKS.inc(operation="answer", reason="no_model")
         return f"Mock answer: This is a simulated Gemini response for '{question}'."
     try:
-        prompt = f"Content: {content}\n\nStudent Question: {question}\n\nAnswer:"
-        response = gemini_model.generate_content(prompt)
-        return response.text
+        return _call_model("answer", ANSWER_PROMPT.format(content=content, question=question))
+    except Exception as e:
+        LLM_MOCK_FALLBACKS.inc(operation="answer", reason="error")
+        return f"Gemini answer error: {str(e)}"
+
+def stream_cached(prompt_template: str, content: str, **template_args) -> Iterator[str]:
+    """Stream model output as it is produced, caching the full text once complete"""
+    cached = _cached_generation(prompt_template, content, **template_args)
+    if cached is not None:
+        yield cached
+        return
+    key = _cache_key(prompt_template, content, **template_args)
+    operation = PROMPT_OPERATIONS.get(prompt_template, "generate")
+    parts = []
+    for text in _stream_model(operation, prompt_template.format(content=content, **template_args)):
+        parts.append(text)
+        yield text
+    text = "".join(parts)
+    if text.strip():
+        generation_cache.set(key, text)
+
+def stream_summary(content: str) -> Iterator[str]:
+    """Stream a bullet point summary using Gemini"""
+    if not get_model() or needs_chunking(content):
+        # Map-reduce has nothing to stream until the reduce step, so send the result at once
+        yield "\n".join(f"- {point}" for point in generate_summary(content))
+        return
+    # Model errors propagate so the stream ends with an error event instead of looking complete
+    yield from stream_cached(SUMMARY_PROMPT, content)
+
+def stream_answer(content: str, question: str) -> Iterator[str]:
+    """Stream the answer to a student question using Gemini"""
+    if not get_model():
+        for word in answer_question(content, question).split(" "):
+            yield word + " "
+        return
+    yield from _stream_model("answer", ANSWER_PROMPT.format(content=content, question=question))
+
+def _extract_json_object(text: str) -> dict:
+    """Pull the outermost JSON object out of a model response"""
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("No JSON object in model response")
+    return json.loads(text[start:end + 1])
+
+def _quiz_from_json(items: Iterable[dict]) -> List[QuizQuestion]:
+    questions = []
+    for item in items:
+        options = item.get("options", [])
+        if isinstance(options, dict):
+            options = list(options.values())
+        # Models sometimes repeat the letter inside the option text
+        options = [_option_prefix_re.sub("", str(opt).strip()) for opt in options]
+        answer = _option_prefix_re.sub("", str(item.get("correct_answer", item.get("answer", ""))).strip())
+        if len(answer) == 1 and answer.upper() in "ABCD" and ord(answer.upper()) - 65 < len(options):
+            answer = options[ord(answer.upper()) - 65]
+        if item.get("question") and len(options) == 4 and answer in options:
+            questions.append(QuizQuestion(question=str(item["question"]).strip(), options=options, correct_answer=answer))
+    return questions
+
+def _lesson_from_generators(content: str, include_deck: bool) -> dict:
+    summary = generate_summary(content)
+    return {
+        "summary": summary,
+        "quiz": generate_quiz(content),
+        "flashcards": generate_flashcards(content),
+        "deck": [DeckSlide(title="Lesson Summary", bullets=summary)] if include_deck else None,
+    }
+
+def _parse_lesson(lesson_text: str, include_deck: bool) -> dict:
+    """Parse a combined lesson response, raising ValueError if it lacks a summary or quiz"""
+    data = _extract_json_object(lesson_text)
+    summary = [str(point).strip() for point in data.get("summary", []) if str(point).strip()][:5]
+    quiz = _quiz_from_json(data.get("quiz", []))
+    flashcards = _dedupe_flashcards(_flashcards_from_json(
+        card for card in data.get("flashcards", []) if isinstance(card, dict)
+    ))[:FLASHCARD_COUNT]
+    deck = None
+    if include_deck:
+        deck = [
+            DeckSlide(title=str(slide.get("title", "")).strip(), bullets=[str(b) for b in slide.get("bullets", [])])
+            for slide in data.get("deck", [])
+        ]
+    if not summary or not quiz:
+        raise ValueError("Lesson response missing summary or quiz")
+    return {"summary": summary, "quiz": quiz, "flashcards": flashcards, "deck": deck}
+
+def generate_lesson(content: str, include_deck: bool = False) -> dict:
+    """Generate summary, quiz, flashcards and optionally a slide deck in a single Gemini call"""
+    if not get_model() or needs_chunking(content):
+        # Large documents go through the chunked per-artifact pipeline instead
+        return _lesson_from_generators(content, include_deck)
+    try:
+        lesson = generate_cached(
+            LESSON_PROMPT, content, json_mode=True, parse=lambda text: _parse_lesson(text, include_deck),
+            deck_schema=LESSON_DECK_SCHEMA if include_deck else ""
+        )
+        lesson["quiz"] = _fill_missing_questions(content, _dedupe_questions(lesson["quiz"]))
+        return lesson
     except Exception as e:
-        return f"Gemini answer error: {str(e)}"
\ No newline at end of file
+        # Fall back to the individual generators if the combined response is unusable
+        logger.error(f"Combined lesson generation failed: {e}")
+        return _lesson_from_generators(content, include_deck)
@@ -1,17 +1,40 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, status, BackgroundTasks
-from fastapi.responses import Response, JSONResponse
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Query, status, BackgroundTasks, Request
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 import os
 from dotenv import load_dotenv
 load_dotenv()
-import PyPDF2
 import logging
-import io
-from database import init_db, create_user, get_user_by_email, update_user_password
-from auth import hash_password, verify_password, create_access_token, verify_token
+import json
+import asyncio
+import threading
+import time
+from typing import List, Optional, Tuple
+from database import init_db, close_all_connections, create_user, get_user_by_email, list_documents
+from auth import ahash_password, averify_password, create_access_token, verify_token, update_user_password
 from models import *
-from ai_service import generate_summary, generate_quiz, answer_question
-from export_service import create_powerpoint, create_pdf
+from async_ai_service import (
+    agenerate_summary, agenerate_quiz, agenerate_flashcards, agenerate_lesson, aanswer_question,
+    astream_summary, astream_answer
+)
+from export_service import (
+    render_export, iter_chunks, PPTX_MEDIA_TYPE, PDF_MEDIA_TYPE, QUESTIONS_PER_SLIDE, MAX_QUESTIONS_PER_SLIDE
+)
+from artifact_store import ArtifactStore
+from document_store import document_store
+from admission import admit, spend
+from retrieval import retrieval_indexes, build_question_context
+import ai_service
+import document_parser
+import export_service
+import password_hashing
+from document_parser import extract_upload, join_sections
+from batch_service import extract_batch, stream_batch
+from job_queue import submit_job, recover_jobs, get_job_for_user, JOB_FILENAMES
+from metrics import (
+    REQUEST_SECONDS, render_metrics, start_request_timing, finish_request_timing, server_timing_header
+)
 
 app = FastAPI(title="BRAINBUDDY API", version="1.0.0", description="API for converting lessons using BRAINBUDDY")
 
@@ -28,13 +51,96 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    """Time every request and report its stages in a Server-Timing header"""
+    started = time.perf_counter()
+    token = start_request_timing()
+    try:
+        response = await call_next(request)
+    finally:
+        stages = finish_request_timing(token)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(
+        elapsed, method=request.method, route=getattr(route, "path", "unmatched"), status=str(response.status_code)
+    )
+    response.headers["Server-Timing"] = server_timing_header(stages, elapsed)
+    return response
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Refuse uploads whose declared size is over the limit before their body is read"""
+    if request.method == "POST" and request.url.path == "/upload":
+        try:
+            declared = int(request.headers.get("content-length", "0"))
+        except ValueError:
+            declared = 0
+        max_bytes = document_parser.MAX_UPLOAD_BYTES
+        if declared > max_bytes + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={"detail": f"File too large. Maximum upload size is {max_bytes // (1024 * 1024)} MB."}
+            )
+    return await call_next(request)
+
+# Load the model client, parsers and exporters in the background so workers answer health checks right away
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+
+def warm_up():
+    """Load everything deferred at import time, off the request path"""
+    started = time.perf_counter()
+    for name, step in (("model", ai_service.get_model), ("parsers", document_parser.warm_up),
+                       ("exporters", export_service.warm_up), ("password hashing", password_hashing.current_rounds)):
+        try:
+            step()
+        except Exception as e:
+            logger.error(f"Warm-up of {name} failed: {e}")
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.1f}s")
+
 # Initialize database on startup
 @app.on_event("startup")
 def startup_event():
     init_db()
+    recover_jobs()
+    if WARM_UP_ON_STARTUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    close_all_connections()
 
-# Store uploaded content temporarily (in production, use proper storage)
-uploaded_content = {}
+JOB_POLL_SECONDS = 0.5
+
+def _document_not_found(document_id: Optional[str]) -> HTTPException:
+    if document_id is not None:
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="No content uploaded. Please upload a file first."
+    )
+
+async def _load_document(user_email: str, document_id: Optional[str]) -> Tuple[str, str]:
+    """Load a user's document, defaulting to their latest upload"""
+    document = await run_in_threadpool(document_store.load, user_email, document_id)
+    if document is None:
+        raise _document_not_found(document_id)
+    return document
+
+async def _load_source(user_email: str, document_id: Optional[str]) -> Tuple[str, str]:
+    """Load a user's document for generation as (document_id, content).
+
+    Near-duplicates of an earlier upload reuse that document's cached generations on a cache miss.
+    """
+    document = await run_in_threadpool(document_store.load_source, user_email, document_id)
+    if document is None:
+        raise _document_not_found(document_id)
+    document_id, content, source_content = document
+    ai_service.reuse_generations_from(content, source_content)
+    return document_id, content
 
 @app.post("/register")
 async def register(user_data: UserCreate):
@@ -46,7 +152,7 @@ async def register(user_data: UserCreate):
             detail="Email already registered"
         )
     
-    password_hash = hash_password(user_data.password)
+    password_hash = await ahash_password(user_data.password)
     user_id = create_user(user_data.email, password_hash)
     
     return {"message": "User created successfully", "user_id": user_id}
@@ -55,13 +161,17 @@ async def register(user_data: UserCreate):
 async def login(user_data: UserLogin):
     """Login user and return JWT token"""
     user = get_user_by_email(user_data.email)
-    if not user or not verify_password(user_data.password, user["password_hash"]):
+    valid, upgraded_hash = await averify_password(user_data.password, user["password_hash"] if user else None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
+    if upgraded_hash:
+        # Move legacy SHA-256 hashes and outdated bcrypt costs to the current cost
+        await run_in_threadpool(update_user_password, user_data.email, upgraded_hash)
     
-    access_token = create_access_token({"sub": user_data.email})
+    access_token = create_access_token({"sub": user_data.email, "uid": user["id"]})
     return Token(access_token=access_token)
 
 @app.post("/logout")
@@ -98,58 +208,40 @@ async def reset_password(data: dict):
     new_password = data.get("new_password")
     if not (email and token and new_password):
         raise HTTPException(status_code=400, detail="Missing fields")
-    success = reset_user_password(email, token, new_password)
+    success = await run_in_threadpool(reset_user_password, email, token, new_password)
     if not success:
         raise HTTPException(status_code=400, detail="Invalid token or email")
     return {"message": "Password reset successful"}
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...), current_user=Depends(verify_token)):
     try:
-        content = ""
-        if file.content_type == "application/pdf":
-            pdf_bytes = await file.read()
-            try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-                for page in pdf_reader.pages:
-                    content += page.extract_text() + "\n"
-            except Exception as e:
-                logger.error(f"PDF parsing error: {e}")
-                raise HTTPException(status_code=400, detail="Failed to parse PDF file.")
-        elif file.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            docx_bytes = await file.read()
-            try:
-                from docx import Document
-                doc = Document(io.BytesIO(docx_bytes))
-                for para in doc.paragraphs:
-                    content += para.text + "\n"
-            except Exception as e:
-                logger.error(f"DOCX parsing error: {e}")
-                raise HTTPException(status_code=400, detail="Failed to parse DOCX file.")
-        elif file.content_type == "application/vnd.openxmlformats-officedocument.presentationml.presentation":
-            pptx_bytes = await file.read()
-            try:
-                from pptx import Presentation
-                prs = Presentation(io.BytesIO(pptx_bytes))
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text"):
-                            content += shape.text + "\n"
-            except Exception as e:
-                logger.error(f"PPTX parsing error: {e}")
-                raise HTTPException(status_code=400, detail="Failed to parse PPTX file.")
-        elif file.content_type.startswith("text/"):
-            text_bytes = await file.read()
-            try:
-                content = text_bytes.decode("utf-8")
-            except Exception as e:
-                logger.error(f"Text file decoding error: {e}")
-                raise HTTPException(status_code=400, detail="Failed to decode text file.")
-        else:
-            logger.warning(f"Unsupported file type: {file.content_type}")
-            raise HTTPException(status_code=400, detail="Unsupported file type. Please upload PDF, PPTX, DOCX, or text files.")
-        uploaded_content[current_user["email"]] = content
+        sections = await extract_upload(file)
+        content = join_sections(sections)
+        document_id = await run_in_threadpool(document_store.save, current_user["email"], file.filename, content)
+        # Build the /ask retrieval index now so the first question doesn't pay for it
+        await run_in_threadpool(retrieval_indexes.get, document_id, content)
         logger.info(f"File uploaded for user: {current_user['email']}")
-        return UploadResponse(message="File uploaded successfully", content=content[:500] + "..." if len(content) > 500 else content)
+        response = UploadResponse(
+            message="File uploaded successfully",
+            content=content[:500] + "..." if len(content) > 500 else content,
+            document_id=document_id
+        )
+        response.near_duplicate_similarity = await run_in_threadpool(document_store.near_duplicate_similarity, document_id)
+        if response.near_duplicate_similarity is not None:
+            logger.info(f"Upload {document_id} reuses generations of a near-duplicate ({response.near_duplicate_similarity:.2f})")
+        # Identical re-uploads reuse every artifact. Otherwise only map-reduce documents reuse per-chunk
+        # generations for unchanged sections; anything under CHUNK_TOKEN_BUDGET is regenerated in full
+        revision = await run_in_threadpool(document_store.diff_with_previous, current_user["email"], file.filename, document_id)
+        if revision is not None:
+            previous_id, changed, removed, total = revision
+            response.previous_document_id = previous_id
+            response.changed_sections = len(changed)
+            response.removed_sections = removed
+            response.total_sections = total
+            if not changed and not removed:
+                artifact_store.copy(current_user["email"], previous_id, document_id)
+            logger.info(f"Re-upload of {file.filename}: {len(changed)} of {total} sections changed, {removed} removed")
+        return response
     except HTTPException as e:
         logger.error(f"Upload error: {e.detail}")
         raise
@@ -157,50 +249,111 @@ async def upload_file(file: UploadFile = File(...), current_user=Depends(verify_
         logger.error(f"Unexpected error: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+@app.get("/documents")
+async def get_documents(current_user=Depends(verify_token)):
+    """List the current user's uploaded documents"""
+    rows = await run_in_threadpool(list_documents, current_user["email"])
+    return [
+        DocumentInfo(document_id=row["id"], filename=row["filename"], size=row["size"], created_at=str(row["created_at"]))
+        for row in rows
+    ]
+
 @app.post("/summarize")
-async def summarize_content(current_user=Depends(verify_token)):
+async def summarize_content(request: Request, document_id: Optional[str] = None, current_user=Depends(admit("generate"))):
     """Generate summary from uploaded content"""
     user_email = current_user["email"]
     
-    if user_email not in uploaded_content:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No content uploaded. Please upload a file first."
-        )
-    
-    content = uploaded_content[user_email]
-    summary = generate_summary(content)
+    document_id, content = await _load_source(user_email, document_id)
+    summary = await agenerate_summary(content, request)
+    artifact_store.put(user_email, document_id, "summary", summary)
     
     return SummaryResponse(summary=summary)
 
+async def _sse_events(chunks):
+    """Format streamed text chunks as Server-Sent Events, ending with done only if the stream completed"""
+    try:
+        async for chunk in chunks:
+            if chunk is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps({'text': chunk})}\n\n"
+    except HTTPException as e:
+        yield f"event: error\ndata: {json.dumps({'detail': e.detail, 'status': e.status_code})}\n\n"
+        return
+    except Exception as e:
+        logger.error(f"Stream failed: {e}")
+        yield f"event: error\ndata: {json.dumps({'detail': 'AI generation failed. Please try again.', 'status': 500})}\n\n"
+        return
+    yield "event: done\ndata: {}\n\n"
+
+def _sse_response(chunks) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_events(chunks),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/summarize/stream")
+async def summarize_content_stream(request: Request, document_id: Optional[str] = None, current_user=Depends(admit("generate"))):
+    """Stream a summary of the uploaded content as Server-Sent Events"""
+    user_email = current_user["email"]
+    
+    document_id, content = await _load_source(user_email, document_id)
+    return _sse_response(astream_summary(content, request))
+
 @app.post("/generate_quiz")
-async def create_quiz(current_user=Depends(verify_token)):
+async def create_quiz(request: Request, document_id: Optional[str] = None, current_user=Depends(admit("generate"))):
     """Generate quiz from uploaded content"""
     user_email = current_user["email"]
     
-    if user_email not in uploaded_content:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No content uploaded. Please upload a file first."
-        )
-    
-    content = uploaded_content[user_email]
-    quiz = generate_quiz(content)
+    document_id, content = await _load_source(user_email, document_id)
+    quiz = await agenerate_quiz(content, request)
+    artifact_store.put(user_email, document_id, "quiz", quiz)
     
     return QuizResponse(quiz=quiz)
 
+@app.post("/generate_lesson")
+async def create_lesson(request: Request, include_deck: bool = False, document_id: Optional[str] = None, current_user=Depends(admit("lesson"))):
+    """Generate summary, quiz, flashcards and optionally a deck in one AI call"""
+    user_email = current_user["email"]
+    
+    document_id, content = await _load_source(user_email, document_id)
+    lesson = await agenerate_lesson(content, include_deck, request)
+    for kind in ("summary", "quiz", "flashcards"):
+        artifact_store.put(user_email, document_id, kind, lesson[kind])
+    
+    return LessonResponse(
+        summary=SummaryResponse(summary=lesson["summary"]),
+        quiz=QuizResponse(quiz=lesson["quiz"]),
+        flashcards=lesson["flashcards"],
+        deck=lesson["deck"]
+    )
+
 @app.post("/ask")
-async def ask_question(question_data: dict, current_user=Depends(verify_token)):
+async def ask_question(request: Request, question_data: dict, document_id: Optional[str] = None, current_user=Depends(admit("ask"))):
     """Answer question about uploaded content"""
     user_email = current_user["email"]
     
-    if user_email not in uploaded_content:
+    document_id, content = await _load_document(user_email, document_id)
+    question = question_data.get("question", "")
+    
+    if not question:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No content uploaded. Please upload a file first."
+            detail="Question is required"
         )
     
-    content = uploaded_content[user_email]
+    context = await run_in_threadpool(build_question_context, document_id, content, question)
+    answer = await aanswer_question(context, question, request)
+    
+    return AskResponse(question=question, answer=answer)
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: Request, question_data: dict, document_id: Optional[str] = None, current_user=Depends(admit("ask"))):
+    """Stream the answer to a question about uploaded content as Server-Sent Events"""
+    user_email = current_user["email"]
+    
+    document_id, content = await _load_document(user_email, document_id)
     question = question_data.get("question", "")
     
     if not question:
@@ -209,77 +362,172 @@ async def ask_question(question_data: dict, current_user=Depends(verify_token)):
             detail="Question is required"
         )
     
-    answer = answer_question(content, question)
-    
-    return AskResponse(question=question, answer=answer)
+    context = await run_in_threadpool(build_question_context, document_id, content, question)
+    return _sse_response(astream_answer(context, question, request))
 
-# Store generated data temporarily
-user_data = {}
+# Generated summaries, quizzes and flashcards, reused by the export endpoints
+artifact_store = ArtifactStore()
 
 @app.post("/export_ppt")
-async def export_powerpoint(current_user=Depends(verify_token)):
+async def export_powerpoint(request: Request, document_id: Optional[str] = None,
+                            questions_per_slide: int = Query(QUESTIONS_PER_SLIDE, ge=1, le=MAX_QUESTIONS_PER_SLIDE),
+                            current_user=Depends(admit("export"))):
     """Export lesson as PowerPoint"""
     user_email = current_user["email"]
     
-    if user_email not in uploaded_content:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No content uploaded. Please upload a file first."
-        )
-    
-    # Generate or retrieve summary and quiz
-    content = uploaded_content[user_email]
-    summary = generate_summary(content)
-    quiz = generate_quiz(content)
+    # Reuse stored summary and quiz, generating only missing pieces
+    document_id, content = await _load_source(user_email, document_id)
+    summary = artifact_store.get(user_email, document_id, "summary")
+    if summary is None:
+        summary = await agenerate_summary(content, request)
+        artifact_store.put(user_email, document_id, "summary", summary)
+    quiz = artifact_store.get(user_email, document_id, "quiz")
+    if quiz is None:
+        quiz = await agenerate_quiz(content, request)
+        artifact_store.put(user_email, document_id, "quiz", quiz)
     
     # Create PowerPoint
-    ppt_bytes = create_powerpoint(summary, quiz)
+    ppt_bytes = await render_export("pptx", summary, quiz, questions_per_slide=questions_per_slide)
     
     return Response(
         content=ppt_bytes,
-        media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+        media_type=PPTX_MEDIA_TYPE,
         headers={"Content-Disposition": "attachment; filename=lesson.pptx"}
     )
 
 @app.post("/export_pdf")
-async def export_pdf(current_user=Depends(verify_token)):
+async def export_pdf(request: Request, document_id: Optional[str] = None, current_user=Depends(admit("export"))):
     """Export lesson as PDF"""
     user_email = current_user["email"]
     
-    if user_email not in uploaded_content:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No content uploaded. Please upload a file first."
-        )
-    
-    # Generate or retrieve summary and quiz
-    content = uploaded_content[user_email]
-    summary = generate_summary(content)
-    quiz = generate_quiz(content)
+    # Reuse stored summary and quiz, generating only missing pieces
+    document_id, content = await _load_source(user_email, document_id)
+    summary = artifact_store.get(user_email, document_id, "summary")
+    if summary is None:
+        summary = await agenerate_summary(content, request)
+        artifact_store.put(user_email, document_id, "summary", summary)
+    quiz = artifact_store.get(user_email, document_id, "quiz")
+    if quiz is None:
+        quiz = await agenerate_quiz(content, request)
+        artifact_store.put(user_email, document_id, "quiz", quiz)
     
     # Create PDF
-    pdf_bytes = create_pdf(summary, quiz)
+    pdf_bytes = await render_export("pdf", summary, quiz)
     
-    return Response(
-        content=pdf_bytes,
-        media_type="application/pdf",
-        headers={"Content-Disposition": "attachment; filename=lesson.pdf"}
+    return StreamingResponse(
+        iter_chunks(pdf_bytes),
+        media_type=PDF_MEDIA_TYPE,
+        headers={"Content-Disposition": "attachment; filename=lesson.pdf", "Content-Length": str(len(pdf_bytes))}
     )
 
 @app.post("/generate_flashcards")
-async def create_flashcards(current_user=Depends(verify_token)):
+async def create_flashcards(request: Request, document_id: Optional[str] = None, current_user=Depends(admit("generate"))):
     """Generate flashcards from uploaded content"""
     user_email = current_user["email"]
-    if user_email not in uploaded_content:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No content uploaded. Please upload a file first."
-        )
-    content = uploaded_content[user_email]
-    from ai_service import generate_flashcards
-    flashcards = generate_flashcards(content)
+    document_id, content = await _load_source(user_email, document_id)
+    # Reloading a study session reuses the document's cards instead of generating again
+    flashcards = artifact_store.get(user_email, document_id, "flashcards")
+    if flashcards is None:
+        flashcards = await agenerate_flashcards(content, request)
+        artifact_store.put(user_email, document_id, "flashcards", flashcards)
     return {"flashcards": [fc.dict() for fc in flashcards]}
 
+@app.post("/batch")
+async def batch_generate(files: List[UploadFile] = File(...), exports: bool = True, current_user=Depends(admit("batch"))):
+    """Generate a summary, quiz and exports for many documents or zip archives, streaming a JSON line per document"""
+    user_email = current_user["email"]
+    documents, failures = await extract_batch(files)
+    logger.info(f"Batch of {len(documents)} documents for user: {user_email}")
+
+    async def results():
+        for failure in failures:
+            yield failure.json() + "\n"
+        async for result in stream_batch(user_email, documents, exports):
+            if result.status == "done":
+                artifact_store.put(user_email, result.document_id, "summary", result.summary)
+                artifact_store.put(user_email, result.document_id, "quiz", result.quiz)
+            yield result.json() + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def _job_status(job) -> JobStatusResponse:
+    return JobStatusResponse(
+        job_id=job["id"], kind=job["kind"], status=job["status"],
+        attempts=job["attempts"], error=job["error"]
+    )
+
+@app.post("/jobs/{kind}")
+async def queue_job(kind: str, document_id: Optional[str] = None, current_user=Depends(admit("export"))):
+    """Queue quiz generation or an export as a background job"""
+    user_email = current_user["email"]
+    
+    if kind not in JOB_FILENAMES:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown job type")
+    document_id, _ = await _load_document(user_email, document_id)
+    payload = {"document_id": document_id, "user_email": user_email}
+    # Hand already generated artifacts to the worker so it doesn't regenerate them
+    summary = artifact_store.get(user_email, document_id, "summary")
+    quiz = artifact_store.get(user_email, document_id, "quiz")
+    if summary is not None:
+        payload["summary"] = summary
+    if quiz is not None and kind != "quiz":
+        payload["quiz"] = [q.dict() for q in quiz]
+    # The worker's generations are charged to the user now, so an over-budget user can't park job workers
+    generations = 1 if kind == "quiz" else (summary is None) + ("quiz" not in payload)
+    if generations:
+        spend(user_email, "generate", generations)
+    job_id = await run_in_threadpool(submit_job, user_email, kind, document_id, payload)
+    
+    return JobResponse(job_id=job_id, status="queued")
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, current_user=Depends(verify_token)):
+    """Get the status of a background job"""
+    job = await run_in_threadpool(get_job_for_user, job_id, current_user["email"])
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return _job_status(job)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_status(job_id: str, current_user=Depends(verify_token)):
+    """Stream job status changes as Server-Sent Events until the job finishes"""
+    job = await run_in_threadpool(get_job_for_user, job_id, current_user["email"])
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    async def events():
+        last = None
+        while True:
+            job = await run_in_threadpool(get_job_for_user, job_id, current_user["email"])
+            current = _job_status(job)
+            if current != last:
+                yield f"data: {current.json()}\n\n"
+                last = current
+            if current.status in ("done", "failed"):
+                return
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, current_user=Depends(verify_token)):
+    """Download the result of a finished background job"""
+    job = await run_in_threadpool(get_job_for_user, job_id, current_user["email"])
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job['status']}")
+    return Response(
+        content=job["result"],
+        media_type=job["media_type"],
+        headers={"Content-Disposition": f"attachment; filename={JOB_FILENAMES[job['kind']]}"}
+    )
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "AI Lesson Converter API", "status": "running"}
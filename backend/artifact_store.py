@@ -0,0 +1,38 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+ARTIFACT_STORE_MAX_DOCUMENTS = int(os.getenv("ARTIFACT_STORE_MAX_DOCUMENTS", "512"))
+
+class ArtifactStore:
+    """Per-user, per-document store for generated summaries, quizzes and flashcards"""
+
+    def __init__(self, max_documents: int = ARTIFACT_STORE_MAX_DOCUMENTS):
+        self.max_documents = max_documents
+        self._artifacts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_email: str, document_id: str, kind: str) -> Optional[Any]:
+        """Return a stored artifact or None"""
+        with self._lock:
+            artifacts = self._artifacts.get((user_email, document_id))
+            if artifacts is None:
+                return None
+            self._artifacts.move_to_end((user_email, document_id))
+            return artifacts.get(kind)
+
+    def put(self, user_email: str, document_id: str, kind: str, value: Any):
+        """Store a generated artifact, evicting the least recently used documents"""
+        with self._lock:
+            self._artifacts.setdefault((user_email, document_id), {})[kind] = value
+            self._artifacts.move_to_end((user_email, document_id))
+            while len(self._artifacts) > self.max_documents:
+                self._artifacts.popitem(last=False)
+
+    def copy(self, user_email: str, source_document_id: str, document_id: str):
+        """Share one document's artifacts with another that has the same content"""
+        with self._lock:
+            artifacts = self._artifacts.get((user_email, source_document_id))
+        for kind, value in (artifacts or {}).items():
+            self.put(user_email, document_id, kind, value)
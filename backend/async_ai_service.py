@@ -0,0 +1,164 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, List, Optional
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+import ai_service
+from models import QuizQuestion, Flashcard
+
+logger = logging.getLogger(__name__)
+
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+AI_CALL_TIMEOUT_SECONDS = float(os.getenv("AI_CALL_TIMEOUT_SECONDS", "60"))
+DISCONNECT_POLL_SECONDS = 0.5
+# Streams emit a keep-alive while the model is quiet so idle proxies don't drop them
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "10"))
+_STREAM_END = object()
+
+# Dedicated pool so blocking Gemini calls never run on the event loop
+# or starve the default executor used by FastAPI for sync dependencies
+_executor = ThreadPoolExecutor(max_workers=AI_MAX_CONCURRENCY, thread_name_prefix="ai-call")
+# asyncio semaphores are bound to a loop, so keep one per running loop
+_semaphores = weakref.WeakKeyDictionary()
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+async def _wait_for_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+async def run_ai_call(func: Callable[..., Any], *args, request: Optional[Request] = None,
+                      timeout: Optional[float] = None) -> Any:
+    """Run a blocking AI call in the AI thread pool with bounded concurrency and a timeout"""
+    timeout = AI_CALL_TIMEOUT_SECONDS if timeout is None else timeout
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        # Carry the request context into the worker so stage timings reach the Server-Timing header
+        call = loop.run_in_executor(_executor, functools.partial(contextvars.copy_context().run, func, *args))
+        waiters = {call}
+        disconnect = None
+        if request is not None:
+            disconnect = asyncio.ensure_future(_wait_for_disconnect(request))
+            waiters.add(disconnect)
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if disconnect is not None:
+                disconnect.cancel()
+        if call in done:
+            return call.result()
+        # The worker thread cannot be interrupted; drop its result when it finishes
+        call.cancel()
+        if disconnect is not None and disconnect in done:
+            logger.info(f"Client disconnected, abandoning {func.__name__}")
+            raise HTTPException(status_code=499, detail="Client closed request")
+        logger.error(f"{func.__name__} timed out after {timeout}s")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="AI generation timed out. Please try again."
+        )
+
+def _close_quietly(iterator):
+    try:
+        iterator.close()
+    except ValueError:
+        # Still running in another worker; it will finish on its own
+        pass
+
+async def astream_ai_call(func: Callable[..., Any], *args, request: Optional[Request] = None,
+                          timeout: Optional[float] = None) -> AsyncIterator[Optional[str]]:
+    """Iterate a blocking AI generator in the AI thread pool, yielding None as a keep-alive tick.
+
+    Raises HTTPException if the stream stalls past the timeout or the client disconnects, so a cut-off
+    stream is never mistaken for a complete one.
+    """
+    timeout = AI_CALL_TIMEOUT_SECONDS if timeout is None else timeout
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        iterator = func(*args)
+        context = contextvars.copy_context()
+        try:
+            while True:
+                pending = loop.run_in_executor(_executor, context.run, next, iterator, _STREAM_END)
+                waited = 0.0
+                while True:
+                    done, _ = await asyncio.wait({pending}, timeout=STREAM_KEEPALIVE_SECONDS)
+                    if done:
+                        break
+                    waited += STREAM_KEEPALIVE_SECONDS
+                    if waited >= timeout:
+                        logger.error(f"{func.__name__} stream stalled for {timeout}s")
+                        raise HTTPException(
+                            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                            detail="AI generation timed out. Please try again."
+                        )
+                    if request is not None and await request.is_disconnected():
+                        logger.info(f"Client disconnected, abandoning {func.__name__} stream")
+                        raise HTTPException(status_code=499, detail="Client closed request")
+                    yield None
+                chunk = pending.result()
+                if chunk is _STREAM_END:
+                    return
+                yield chunk
+        finally:
+            # Runs in the pool so a generator blocked on the network never stalls the loop
+            loop.run_in_executor(_executor, _close_quietly, iterator)
+
+async def _generation_timeout(content: str, max_chunks: Optional[int] = None) -> float:
+    # Map-reduce makes many rounds of calls, so a large document gets the per-call timeout for each round
+    if not ai_service.needs_chunking(content):
+        return AI_CALL_TIMEOUT_SECONDS
+    waves = await run_in_threadpool(ai_service.generation_waves, content, max_chunks)
+    return AI_CALL_TIMEOUT_SECONDS * waves
+
+async def agenerate_summary(content: str, request: Optional[Request] = None) -> List[str]:
+    """Async wrapper for generate_summary"""
+    timeout = await _generation_timeout(content)
+    return await run_ai_call(ai_service.generate_summary, content, request=request, timeout=timeout)
+
+async def agenerate_quiz(content: str, request: Optional[Request] = None) -> List[QuizQuestion]:
+    """Async wrapper for generate_quiz"""
+    timeout = await _generation_timeout(content, ai_service.QUIZ_QUESTIONS)
+    return await run_ai_call(ai_service.generate_quiz, content, request=request, timeout=timeout)
+
+async def agenerate_flashcards(content: str, request: Optional[Request] = None) -> List[Flashcard]:
+    """Async wrapper for generate_flashcards"""
+    timeout = await _generation_timeout(content, ai_service.FLASHCARD_COUNT)
+    return await run_ai_call(ai_service.generate_flashcards, content, request=request, timeout=timeout)
+
+async def agenerate_lesson(content: str, include_deck: bool = False, request: Optional[Request] = None) -> dict:
+    """Async wrapper for generate_lesson"""
+    timeout = AI_CALL_TIMEOUT_SECONDS
+    if ai_service.needs_chunking(content):
+        # Large lessons generate the summary, quiz and flashcards one after another
+        timeout = sum([
+            await _generation_timeout(content), await _generation_timeout(content, ai_service.QUIZ_QUESTIONS),
+            await _generation_timeout(content, ai_service.FLASHCARD_COUNT)
+        ])
+    return await run_ai_call(ai_service.generate_lesson, content, include_deck, request=request, timeout=timeout)
+
+async def aanswer_question(content: str, question: str, request: Optional[Request] = None) -> str:
+    """Async wrapper for answer_question"""
+    return await run_ai_call(ai_service.answer_question, content, question, request=request)
+
+async def astream_summary(content: str, request: Optional[Request] = None) -> AsyncIterator[Optional[str]]:
+    """Async stream of generate_summary output"""
+    # Map-reduce summaries stay silent until the reduce step, so the stall timeout covers every round
+    timeout = await _generation_timeout(content)
+    async for chunk in astream_ai_call(ai_service.stream_summary, content, request=request, timeout=timeout):
+        yield chunk
+
+def astream_answer(content: str, question: str, request: Optional[Request] = None) -> AsyncIterator[Optional[str]]:
+    """Async stream of answer_question output"""
+    return astream_ai_call(ai_service.stream_answer, content, question, request=request)
@@ -1,33 +1,62 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
-import hashlib
 import secrets
-from database import get_user_by_email, save_reset_token, get_reset_token, delete_reset_token, update_user_password
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from database import get_user_by_email, save_reset_token, get_reset_token, delete_reset_token
+from database import update_user_password as _db_update_user_password
+from password_hashing import hash_password, ahash_password, averify_password, verify_password as _verify_password
 
 SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Verified users are cached briefly so most requests skip the database
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
-def hash_password(password: str) -> str:
-    """Hash password using SHA256 (simplified for demo)"""
-    return hashlib.sha256(password.encode()).hexdigest()
+_principal_cache = OrderedDict()
+_principal_cache_lock = threading.Lock()
+
+def _get_cached_principal(email: str):
+    with _principal_cache_lock:
+        entry = _principal_cache.get(email)
+        if entry is None:
+            return None
+        principal, expires_at = entry
+        if expires_at < time.monotonic():
+            del _principal_cache[email]
+            return None
+        return principal
+
+def _cache_principal(email: str, principal: dict):
+    with _principal_cache_lock:
+        _principal_cache[email] = (principal, time.monotonic() + PRINCIPAL_CACHE_TTL_SECONDS)
+        _principal_cache.move_to_end(email)
+        while len(_principal_cache) > PRINCIPAL_CACHE_MAX_ENTRIES:
+            _principal_cache.popitem(last=False)
+
+def invalidate_principal(email: str):
+    """Drop a user's cached principal so the next request re-checks the database"""
+    with _principal_cache_lock:
+        _principal_cache.pop(email, None)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password"""
-    return hash_password(plain_password) == hashed_password
+    return _verify_password(plain_password, hashed_password)[0]
 
 def create_access_token(data: dict):
     """Create JWT access token"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -38,6 +67,7 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
+        user_id = payload.get("uid")
         if email is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -51,14 +81,32 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    principal = _get_cached_principal(email)
+    if principal is not None and (user_id is None or principal["user_id"] == user_id):
+        return principal
+    
     user = get_user_by_email(email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
+    if user_id is not None and user["id"] != user_id:
+        # Token was issued for an account that has since been replaced
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    return {"email": email, "user_id": user["id"]}
+    principal = {"email": email, "user_id": user["id"]}
+    _cache_principal(email, principal)
+    return principal
+
+def update_user_password(email: str, password_hash: str):
+    """Update user's password and invalidate their cached principal"""
+    _db_update_user_password(email, password_hash)
+    invalidate_principal(email)
 
 def generate_reset_token(email: str) -> str:
     """Generate a secure password reset token"""
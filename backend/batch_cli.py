@@ -0,0 +1,88 @@
+"""Generate summaries, quizzes and exports for many documents from the command line.
+
+Run from the backend directory:
+
+    python batch_cli.py course.zip extra-notes.pdf --out results/
+
+Each document gets a directory under --out with summary.json, quiz.json, lesson.pptx and lesson.pdf,
+and one JSON line per document is printed as it finishes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from batch_service import BATCH_MAX_DOCUMENTS, BATCH_WORKERS, extract_entries, generate_document, group_duplicates
+from document_parser import content_type_for, is_archive, remove_unpacked, unpack_archive
+from export_service import create_powerpoint, create_pdf
+from models import BatchDocumentResult, QuizResponse
+
+def _output_dir(out: str, name: str) -> str:
+    path = os.path.join(out, name.replace("/", "__").replace("\\", "__"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _write_outputs(directory: str, summary, quiz, rendered: dict):
+    with open(os.path.join(directory, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    with open(os.path.join(directory, "quiz.json"), "w") as f:
+        json.dump(QuizResponse(quiz=quiz).dict(), f, indent=2)
+    for filename, data in rendered.items():
+        with open(os.path.join(directory, filename), "wb") as f:
+            f.write(data)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate lessons for many documents or zip archives")
+    parser.add_argument("paths", nargs="+", help="Documents (PDF, DOCX, PPTX, text) or zip archives")
+    parser.add_argument("--out", default="batch_output", help="Directory to write results to")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Documents generated in parallel")
+    parser.add_argument("--no-exports", action="store_true", help="Skip PPTX and PDF rendering")
+    args = parser.parse_args(argv)
+
+    entries, unpacked = [], []
+    try:
+        for path in args.paths:
+            if is_archive(path, None):
+                members = unpack_archive(path, BATCH_MAX_DOCUMENTS - len(entries))
+                unpacked.extend(members)
+                entries.extend(members)
+            else:
+                entries.append((os.path.basename(path), path, content_type_for(path)))
+        documents, failures = asyncio.run(extract_entries(entries))
+    finally:
+        remove_unpacked(unpacked)
+
+    for failure in failures:
+        print(failure.json(), flush=True)
+    failed = len(failures)
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(generate_document, group[0][1]): group for group in group_duplicates(documents).values()}
+        for future in as_completed(futures):
+            group = futures[future]
+            canonical = group[0][0]
+            try:
+                summary, quiz = future.result()
+            except Exception as e:
+                failed += len(group)
+                for name, _ in group:
+                    print(BatchDocumentResult(filename=name, status="failed", error=str(e)).json(), flush=True)
+                continue
+            rendered = {}
+            if not args.no_exports:
+                rendered = {"lesson.pptx": create_powerpoint(summary, quiz), "lesson.pdf": create_pdf(summary, quiz)}
+            for name, _ in group:
+                _write_outputs(_output_dir(args.out, name), summary, quiz, rendered)
+                print(BatchDocumentResult(
+                    filename=name, status="done", summary=summary, quiz=quiz,
+                    duplicate_of=canonical if name != canonical else None
+                ).json(), flush=True)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
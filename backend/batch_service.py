@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Tuple
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+import admission
+import ai_service
+from document_parser import (
+    PDF_TYPE, DOCX_TYPE, PPTX_TYPE, content_type_for, extract_sections, is_archive, join_sections,
+    remove_unpacked, spool_upload, unpack_archive
+)
+from document_store import document_store, content_hash_for
+from job_queue import submit_job
+from models import BatchDocumentResult, QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "200"))
+BATCH_EXPORT_KINDS = ("export_ppt", "export_pdf")
+
+# Separate from the request-path AI pool so a large batch can't starve interactive requests
+_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+
+def _is_supported(content_type: str) -> bool:
+    return content_type in (PDF_TYPE, DOCX_TYPE, PPTX_TYPE) or content_type.startswith("text/")
+
+def _too_many_documents():
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Too many documents. A batch can contain at most {BATCH_MAX_DOCUMENTS}."
+    )
+
+async def extract_entries(entries: List[Tuple[str, str, str]]) -> Tuple[List[Tuple[str, str]], List[BatchDocumentResult]]:
+    """Extract (name, path, content_type) entries in parallel into (name, text) documents and failures"""
+    documents, failures = [], []
+    extracted = await asyncio.gather(
+        *[extract_sections(path, content_type) for _, path, content_type in entries], return_exceptions=True
+    )
+    for (name, _, _), sections in zip(entries, extracted):
+        if isinstance(sections, Exception):
+            error = sections.detail if isinstance(sections, HTTPException) else str(sections)
+            failures.append(BatchDocumentResult(filename=name, status="failed", error=error))
+            continue
+        content = join_sections(sections)
+        if not content.strip():
+            failures.append(BatchDocumentResult(filename=name, status="failed", error="No text found in document."))
+        else:
+            documents.append((name, content))
+    return documents, failures
+
+async def extract_batch(files: List[UploadFile]) -> Tuple[List[Tuple[str, str]], List[BatchDocumentResult]]:
+    """Extract every uploaded document, expanding zip archives"""
+    entries, failures, spooled = [], [], []
+    try:
+        for file in files:
+            if len(entries) + len(failures) >= BATCH_MAX_DOCUMENTS:
+                raise _too_many_documents()
+            if is_archive(file.filename, file.content_type):
+                path = await spool_upload(file)
+                try:
+                    members = await run_in_threadpool(
+                        unpack_archive, path, BATCH_MAX_DOCUMENTS - len(entries) - len(failures)
+                    )
+                finally:
+                    os.unlink(path)
+                spooled.extend(members)
+                entries.extend(members)
+                continue
+            content_type = content_type_for(file.filename, file.content_type)
+            if not _is_supported(content_type):
+                failures.append(BatchDocumentResult(
+                    filename=file.filename or "", status="failed",
+                    error="Unsupported file type. Please upload PDF, PPTX, DOCX, or text files."
+                ))
+                continue
+            entry = (file.filename or "", await spool_upload(file), content_type)
+            spooled.append(entry)
+            entries.append(entry)
+        documents, extract_failures = await extract_entries(entries)
+    finally:
+        remove_unpacked(spooled)
+    return documents, failures + extract_failures
+
+def group_duplicates(documents: List[Tuple[str, str]]) -> Dict[str, List[Tuple[str, str]]]:
+    """Group (name, text) documents by content hash, keeping upload order"""
+    groups = OrderedDict()
+    for name, content in documents:
+        groups.setdefault(content_hash_for(content), []).append((name, content))
+    return groups
+
+def generate_document(content: str) -> Tuple[List[str], List[QuizQuestion]]:
+    """Generate the summary and quiz for one document"""
+    return ai_service.generate_summary(content), ai_service.generate_quiz(content)
+
+def _process_document(user_email: str, filename: str, content: str, exports: bool) -> BatchDocumentResult:
+    document_id = document_store.save(user_email, filename, content)
+    summary, quiz = generate_document(content)
+    export_jobs = None
+    if exports:
+        # Exports render on the job queue from the artifacts generated here
+        payload = {
+            "document_id": document_id, "user_email": user_email,
+            "summary": summary, "quiz": [q.dict() for q in quiz],
+        }
+        export_jobs = {kind: submit_job(user_email, kind, document_id, payload) for kind in BATCH_EXPORT_KINDS}
+    return BatchDocumentResult(
+        filename=filename, status="done", document_id=document_id,
+        summary=summary, quiz=quiz, export_jobs=export_jobs
+    )
+
+async def _generate_paced(user_email: str, filename: str, content: str, exports: bool) -> BatchDocumentResult:
+    # Each document spends the user's admission budget, so a large batch runs at the user's rate
+    await admission.admission_controller.charge(user_email, "batch_document")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _process_document, user_email, filename, content, exports)
+
+async def stream_batch(user_email: str, documents: List[Tuple[str, str]],
+                       exports: bool = True) -> AsyncIterator[BatchDocumentResult]:
+    """Process each distinct document on the batch pool, yielding results as documents finish"""
+    pending = {}
+    for group in group_duplicates(documents).values():
+        filename, content = group[0]
+        pending[asyncio.ensure_future(_generate_paced(user_email, filename, content, exports))] = group
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                group = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Batch document {group[0][0]} failed: {e}")
+                    for filename, _ in group:
+                        yield BatchDocumentResult(filename=filename, status="failed", error=str(e))
+                    continue
+                yield result
+                # Identical documents share the generated results
+                for filename, _ in group[1:]:
+                    yield result.copy(update={"filename": filename, "duplicate_of": result.filename})
+    finally:
+        # Drop documents that haven't started, or are still waiting on the budget, if the client goes away
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,72 @@
+import json
+import random
+import threading
+import time
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class StubGeminiModel:
+    """Offline stand-in for ai_service.gemini_model with configurable latency and jitter"""
+
+    def __init__(self, latency_ms: float = 200, jitter_ms: float = 50, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _text_for(self, prompt: str) -> str:
+        if "single JSON object" in prompt:
+            return json.dumps({
+                "summary": [f"Stub point {i}" for i in range(5)],
+                "quiz": [
+                    {"question": f"Stub question {i}?", "options": ["a", "b", "c", "d"], "correct_answer": "A"}
+                    for i in range(15)
+                ],
+                "flashcards": [{"front": f"Term {i}", "back": f"Definition {i}"} for i in range(10)],
+                "deck": [{"title": "Stub slide", "bullets": ["one", "two", "three"]}],
+            })
+        if "multiple choice" in prompt:
+            return json.dumps([
+                {"question": f"Stub question {i}?", "options": ["a", "b", "c", "d"], "correct_answer": "A"}
+                for i in range(15)
+            ])
+        if "flashcards" in prompt:
+            return json.dumps([{"front": f"Stub term {i}", "back": f"Definition {i}"} for i in range(10)])
+        if "Student Question" in prompt:
+            return "This is a stubbed answer to the student's question."
+        return "\n".join(f"- Stub point {i}" for i in range(5))
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        delay = self._delay()
+        text = self._text_for(prompt)
+        if stream:
+            return self._stream(text, delay)
+        time.sleep(delay)
+        return StubResponse(text)
+
+    def _stream(self, text: str, delay: float):
+        words = text.split(" ")
+        # Spend half the latency before the first token, like a real model
+        time.sleep(delay / 2)
+        step = delay / 2 / max(len(words), 1)
+        for word in words:
+            time.sleep(step)
+            yield StubResponse(word + " ")
+
+class NullGenerationCache:
+    """Generation cache that never hits, so benchmarks measure the full pipeline"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
@@ -0,0 +1,191 @@
+"""Load-test the API in-process against a stubbed Gemini model.
+
+Run from the backend directory:
+
+    python -m benchmarks.run_benchmarks --concurrency 1,8,32 --requests 64 --save baseline.json
+    python -m benchmarks.run_benchmarks --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_ENDPOINTS = ["token", "upload", "summarize", "generate_quiz", "ask", "export_ppt", "export_pdf"]
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+SAMPLE_DOCUMENT = ("Photosynthesis converts light energy into chemical energy. " * 40 + "\n\n") * 20
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def _request_for(endpoint: str, headers: dict) -> dict:
+    if endpoint == "token":
+        return {"method": "POST", "url": "/token", "json": {"email": BENCH_EMAIL, "password": BENCH_PASSWORD}}
+    if endpoint == "upload":
+        return {
+            "method": "POST", "url": "/upload", "headers": headers,
+            "files": {"file": ("bench.txt", SAMPLE_DOCUMENT.encode("utf-8"), "text/plain")},
+        }
+    if endpoint in ("ask", "ask/stream"):
+        return {"method": "POST", "url": f"/{endpoint}", "headers": headers, "json": {"question": "What is photosynthesis?"}}
+    return {"method": "POST", "url": f"/{endpoint}", "headers": headers}
+
+async def run_scenario(client, endpoint: str, concurrency: int, total: int, headers: dict) -> dict:
+    """Send total requests to one endpoint with a fixed number of concurrent clients"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.request(**_request_for(endpoint, headers))
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+async def run_suite(endpoints: List[str], concurrency_levels: List[int], requests_per_level: int,
+                    latency_ms: float, jitter_ms: float, use_cache: bool = False) -> Dict[str, dict]:
+    """Run every endpoint at every concurrency level against the stubbed model"""
+    import httpx
+    import admission
+    import ai_service
+    from app import app
+    from auth import hash_password
+    from database import init_db, create_user, get_user_by_email
+    from benchmarks.gemini_stub import StubGeminiModel, NullGenerationCache
+
+    init_db()
+    if not get_user_by_email(BENCH_EMAIL):
+        create_user(BENCH_EMAIL, hash_password(BENCH_PASSWORD))
+    original_model, original_cache = ai_service.gemini_model, ai_service.generation_cache
+    original_admission = admission.admission_controller
+    # Every simulated client shares one account, so only the global limits apply
+    admission.admission_controller = admission.AdmissionController(user_requests_per_minute=0, user_max_concurrent=0)
+    ai_service.gemini_model = StubGeminiModel(latency_ms=latency_ms, jitter_ms=jitter_ms)
+    if not use_cache:
+        ai_service.generation_cache = NullGenerationCache()
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            login = await client.post("/token", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            await client.request(**_request_for("upload", headers))
+            for endpoint in endpoints:
+                for concurrency in concurrency_levels:
+                    result = await run_scenario(client, endpoint, concurrency, requests_per_level, headers)
+                    results[f"{endpoint}@{concurrency}"] = result
+    finally:
+        ai_service.gemini_model, ai_service.generation_cache = original_model, original_cache
+        admission.admission_controller = original_admission
+    return results
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Return a description of every scenario that regressed beyond the tolerance"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if base["p95_ms"] > 0 and result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {base['p95_ms']:.1f}ms -> {result['p95_ms']:.1f}ms")
+        if base["throughput_rps"] > 0 and result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: throughput {base['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} req/s"
+            )
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{key}: errors {base['errors']} -> {result['errors']}")
+    return regressions
+
+def format_report(results: Dict[str, dict]) -> str:
+    lines = [
+        f"{'scenario':<24}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'rss MB':>9}"
+    ]
+    for key, r in results.items():
+        lines.append(
+            f"{key:<24}{r['requests']:>6}{r['errors']:>6}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+            f"{r['p99_ms']:>10.1f}{r['throughput_rps']:>10.1f}{r['peak_rss_mb']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the BRAINBUDDY API against a stubbed Gemini model")
+    parser.add_argument("--endpoints", default=",".join(DEFAULT_ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Stub model latency")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Stub model latency jitter (+/-)")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the generation cache enabled")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare against a saved baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed regression as a fraction")
+    args = parser.parse_args(argv)
+
+    # Run against a throwaway database and an offline model
+    workdir = tempfile.mkdtemp(prefix="brainbuddy-bench-")
+    os.environ.setdefault("DATABASE_URL", os.path.join(workdir, "bench.db"))
+    os.environ.setdefault("GENERATION_CACHE_PATH", os.path.join(workdir, "generation_cache.db"))
+    os.environ["GEMINI_API_KEY"] = ""
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    results = asyncio.run(run_suite(
+        [e for e in args.endpoints.split(",") if e],
+        [int(c) for c in args.concurrency.split(",") if c],
+        args.requests, args.latency_ms, args.jitter_ms, use_cache=args.with_cache
+    ))
+    print(format_report(results))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            print("\n".join(f"  {line}" for line in regressions))
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
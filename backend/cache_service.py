@@ -0,0 +1,136 @@
+import sqlite3
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import logging
+from typing import Optional
+from database import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Generation cache lives next to the main database file
+GENERATION_CACHE_PATH = os.getenv(
+    "GENERATION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "generation_cache.db")
+)
+GENERATION_CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "5000"))
+
+_whitespace_re = re.compile(r"\s+")
+
+def normalize_content(content: str) -> str:
+    """Normalize text so trivially different uploads share a cache key"""
+    return _whitespace_re.sub(" ", content).strip()
+
+def make_cache_key(content: str, prompt_template: str, model_name: str) -> str:
+    """Hash normalized content, prompt template and model name into a cache key"""
+    payload = json.dumps([model_name, prompt_template, normalize_content(content)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class GenerationCache:
+    """Persistent SQLite cache for LLM generations with TTL and LRU eviction"""
+
+    def __init__(self, path: str = GENERATION_CACHE_PATH,
+                 ttl_seconds: int = GENERATION_CACHE_TTL_SECONDS,
+                 max_entries: int = GENERATION_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS generation_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL
+                )
+            ''')
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_generation_cache_last_accessed "
+                "ON generation_cache (last_accessed)"
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value, or None on miss or expiry"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT value, created_at FROM generation_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                conn.execute(
+                    "UPDATE generation_cache SET last_accessed = ? WHERE cache_key = ?", (now, key)
+                )
+                conn.commit()
+                with self._lock:
+                    self.hits += 1
+                return row[0]
+            if row:
+                conn.execute("DELETE FROM generation_cache WHERE cache_key = ?", (key,))
+                conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        """Store a value and evict least recently used entries over the size bound"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO generation_cache (cache_key, value, created_at, last_accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            conn.execute(
+                "DELETE FROM generation_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            count = conn.execute("SELECT COUNT(*) FROM generation_cache").fetchone()[0]
+            if count > self.max_entries:
+                cursor = conn.execute('''
+                    DELETE FROM generation_cache WHERE cache_key IN (
+                        SELECT cache_key FROM generation_cache
+                        ORDER BY last_accessed ASC LIMIT ?
+                    )
+                ''', (count - self.max_entries,))
+                with self._lock:
+                    self.evictions += cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+
+    def clear(self):
+        """Remove every cached entry"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM generation_cache")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters for this process"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+generation_cache = GenerationCache()
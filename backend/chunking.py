@@ -0,0 +1,97 @@
+import hashlib
+import os
+import re
+import zlib
+from typing import List
+
+# Rough conversion used to turn the token budget into a character budget
+CHARS_PER_TOKEN = 4
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "6000"))
+# Chunks past half the budget end at sections whose hash hits this divisor, so boundaries depend on
+# content rather than position and an edited section only changes the chunk it lands in
+CHUNK_BOUNDARY_DIVISOR = 4
+
+_heading_re = re.compile(r"^(#{1,6}\s|\d+(\.\d+)*\s+[A-Z]|[A-Z][A-Z0-9 ,:&-]{3,}$)")
+_sentence_end_re = re.compile(r"(?<=[.!?])\s+")
+
+def split_sections(text: str) -> List[str]:
+    """Split text into sections at page breaks, headings and blank lines"""
+    sections = []
+    current = []
+    for line in text.replace("\r\n", "\n").split("\n"):
+        pages = line.split("\f")
+        for i, part in enumerate(pages):
+            if i > 0 or (current and (not part.strip() or _heading_re.match(part.strip()))):
+                if current:
+                    sections.append("\n".join(current).strip())
+                    current = []
+            if part.strip():
+                current.append(part)
+    if current:
+        sections.append("\n".join(current).strip())
+    return [section for section in sections if section]
+
+def _split_oversized(section: str, max_chars: int) -> List[str]:
+    pieces = []
+    current = ""
+    for sentence in _sentence_end_re.split(section):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_into_chunks(text: str, token_budget: int = CHUNK_TOKEN_BUDGET) -> List[str]:
+    """Pack sections into chunks that fit the token budget, ending chunks at content-defined boundaries"""
+    max_chars = token_budget * CHARS_PER_TOKEN
+    chunks = []
+    current = []
+    current_len = 0
+    for section in split_sections(text):
+        for piece in (_split_oversized(section, max_chars) if len(section) > max_chars else [section]):
+            if current and current_len + len(piece) + 2 > max_chars:
+                chunks.append("\n\n".join(current))
+                current = []
+                current_len = 0
+            current.append(piece)
+            current_len += len(piece) + 2
+            if current_len >= max_chars // 2 and zlib.crc32(piece.encode("utf-8")) % CHUNK_BOUNDARY_DIVISOR == 0:
+                chunks.append("\n\n".join(current))
+                current = []
+                current_len = 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def needs_chunking(text: str, token_budget: int = CHUNK_TOKEN_BUDGET) -> bool:
+    """Return True when the text does not fit in a single prompt budget"""
+    return len(text) > token_budget * CHARS_PER_TOKEN
+
+def section_hashes(text: str) -> List[str]:
+    """Hash each section of the text, ignoring whitespace differences"""
+    return [
+        hashlib.sha256(" ".join(section.split()).encode("utf-8")).hexdigest()[:16]
+        for section in split_sections(text)
+    ]
+
+def changed_sections(previous: List[str], current: List[str]) -> List[int]:
+    """Positions of sections in current that don't appear in previous"""
+    remaining = {}
+    for section_hash in previous:
+        remaining[section_hash] = remaining.get(section_hash, 0) + 1
+    changed = []
+    for i, section_hash in enumerate(current):
+        if remaining.get(section_hash):
+            remaining[section_hash] -= 1
+        else:
+            changed.append(i)
+    return changed
@@ -2,12 +2,77 @@ import sqlite3
 from contextlib import contextmanager
 import hashlib
 import os
+import threading
+import weakref
+from typing import List
+from metrics import DB_CALL_SECONDS, timed_call
 
 DATABASE_URL = os.getenv("DATABASE_URL", "lesson_converter.db")
+DB_PATH = DATABASE_URL.replace("sqlite:///./", "")
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", "5"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "8192"))
+SQLITE_CACHED_STATEMENTS = int(os.getenv("SQLITE_CACHED_STATEMENTS", "256"))
+
+# One long-lived connection per thread instead of a connect/close per query
+_local = threading.local()
+_connections = set()
+_connections_lock = threading.Lock()
+# Bumped when the pool is closed so every thread, not just the closing one, reconnects on next use
+_pool_generation = 0
+
+def _connect() -> sqlite3.Connection:
+    # cached_statements keeps compiled statements around for the life of the connection.
+    # Each connection is only used by its own thread; check_same_thread is off so shutdown can close it.
+    conn = sqlite3.connect(
+        DB_PATH, timeout=SQLITE_BUSY_TIMEOUT_SECONDS,
+        cached_statements=SQLITE_CACHED_STATEMENTS, check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers run alongside the single writer; NORMAL is durable across app crashes in WAL mode
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+def _release(conn: sqlite3.Connection):
+    with _connections_lock:
+        _connections.discard(conn)
+    conn.close()
+
+class _ThreadConnection:
+    """A thread's pooled connection, closed once the thread exits and its locals are dropped"""
+
+    def __init__(self, conn: sqlite3.Connection, generation: int):
+        self.conn = conn
+        self.generation = generation
+        # Short-lived worker threads (anyio retires idle ones after 10s) would otherwise leak a connection each
+        weakref.finalize(self, _release, conn)
+
+def _get_thread_connection() -> sqlite3.Connection:
+    holder = getattr(_local, "holder", None)
+    if holder is None or holder.generation != _pool_generation:
+        conn = _connect()
+        with _connections_lock:
+            _connections.add(conn)
+            generation = _pool_generation
+        _local.holder = _ThreadConnection(conn, generation)
+        return conn
+    return holder.conn
+
+def close_all_connections():
+    """Close every pooled connection (call on shutdown)"""
+    global _pool_generation
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+        _pool_generation += 1
+    _local.__dict__.clear()
 
 def init_db():
     """Initialize database with users table"""
-    conn = sqlite3.connect(DATABASE_URL.replace("sqlite:///./", ""))
+    conn = _get_thread_connection()
     cursor = conn.cursor()
     
     # Create users table
@@ -20,6 +85,67 @@ def init_db():
         )
     ''')
     
+    # Create uploaded documents table (content is zlib-compressed)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS documents (
+            id TEXT PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            filename TEXT,
+            content_hash TEXT NOT NULL,
+            content BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_user ON documents (user_email, created_at)")
+    
+    # Create per-section hashes of uploaded documents, used to diff re-uploads
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_sections (
+            document_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            section_hash TEXT NOT NULL,
+            PRIMARY KEY (document_id, position)
+        )
+    ''')
+    
+    # Create MinHash signatures of uploaded documents and the earlier document each one reuses
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_signatures (
+            document_id TEXT PRIMARY KEY,
+            canonical_id TEXT NOT NULL,
+            similarity REAL NOT NULL,
+            signature BLOB NOT NULL
+        )
+    ''')
+    
+    # Create background jobs table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            dedup_key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            result BLOB,
+            media_type TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            owner TEXT,
+            lease_expires_at REAL
+        )
+    ''')
+    # Databases created before job leases lack the owner columns
+    job_columns = {row["name"] for row in cursor.execute("PRAGMA table_info(jobs)")}
+    for column, column_type in (("owner", "TEXT"), ("lease_expires_at", "REAL")):
+        if column not in job_columns:
+            cursor.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedup_status ON jobs (dedup_key, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_updated ON jobs (status, updated_at)")
+    
     # Create sample user: user@example.com / password123
     sample_password = hashlib.sha256("password123".encode()).hexdigest()
     cursor.execute('''
@@ -28,18 +154,18 @@ def init_db():
     ''', ("user@example.com", sample_password))
     
     conn.commit()
-    conn.close()
 
 @contextmanager
 def get_db_connection():
-    """Database connection context manager"""
-    conn = sqlite3.connect(DATABASE_URL.replace("sqlite:///./", ""))
-    conn.row_factory = sqlite3.Row
+    """Database connection context manager backed by the per-thread pool"""
+    conn = _get_thread_connection()
     try:
         yield conn
-    finally:
-        conn.close()
+    except Exception:
+        conn.rollback()
+        raise
 
+@timed_call(DB_CALL_SECONDS, "db")
 def create_user(email: str, password_hash: str):
     """Create new user"""
     with get_db_connection() as conn:
@@ -51,6 +177,7 @@ def create_user(email: str, password_hash: str):
         conn.commit()
         return cursor.lastrowid
 
+@timed_call(DB_CALL_SECONDS, "db")
 def get_user_by_email(email: str):
     """Get user by email"""
     with get_db_connection() as conn:
@@ -74,9 +201,231 @@ def delete_reset_token(email: str):
     if email in reset_tokens:
         del reset_tokens[email]
 
+@timed_call(DB_CALL_SECONDS, "db")
 def update_user_password(email: str, password_hash: str):
     """Update user's password"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET password_hash = ? WHERE email = ?", (password_hash, email))
         conn.commit()
+
+
+@timed_call(DB_CALL_SECONDS, "db")
+def save_document(document_id: str, user_email: str, filename: str, content_hash: str, content: bytes, size: int,
+                  section_hashes: List[str] = ()):
+    """Save an uploaded document and its section hashes"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO documents (id, user_email, filename, content_hash, content, size) VALUES (?, ?, ?, ?, ?, ?)",
+            (document_id, user_email, filename, content_hash, content, size)
+        )
+        cursor.executemany(
+            "INSERT INTO document_sections (document_id, position, section_hash) VALUES (?, ?, ?)",
+            [(document_id, i, section_hash) for i, section_hash in enumerate(section_hashes)]
+        )
+        conn.commit()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def get_section_hashes(document_id: str) -> List[str]:
+    """Get a document's section hashes in order"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT section_hash FROM document_sections WHERE document_id = ? ORDER BY position", (document_id,)
+        )
+        return [row["section_hash"] for row in cursor.fetchall()]
+
+@timed_call(DB_CALL_SECONDS, "db")
+def get_version_ids(user_email: str, filename: str) -> List[str]:
+    """Get the ids of every upload of a file by a user"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM documents WHERE user_email = ? AND filename = ?", (user_email, filename))
+        return [row["id"] for row in cursor.fetchall()]
+
+@timed_call(DB_CALL_SECONDS, "db")
+def get_previous_version_id(user_email: str, filename: str, document_id: str):
+    """Get the id of the upload of the same file that came before a document"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT id FROM documents
+            WHERE user_email = ? AND filename = ? AND id != ?
+              AND rowid < (SELECT rowid FROM documents WHERE id = ?)
+            ORDER BY rowid DESC LIMIT 1
+            """,
+            (user_email, filename, document_id, document_id)
+        )
+        row = cursor.fetchone()
+        return row["id"] if row else None
+
+@timed_call(DB_CALL_SECONDS, "db")
+def save_document_signature(document_id: str, canonical_id: str, similarity: float, signature: bytes):
+    """Save a document's MinHash signature and the document whose results it reuses"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO document_signatures (document_id, canonical_id, similarity, signature) "
+            "VALUES (?, ?, ?, ?)",
+            (document_id, canonical_id, similarity, signature)
+        )
+        conn.commit()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def get_canonical_signatures():
+    """Get the signatures of every document that isn't a near-duplicate of another"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT document_id, signature FROM document_signatures WHERE canonical_id = document_id")
+        return cursor.fetchall()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def get_document_source(document_id: str):
+    """Get the canonical document id and similarity recorded for a document"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT canonical_id, similarity FROM document_signatures WHERE document_id = ?", (document_id,))
+        return cursor.fetchone()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def get_document(document_id: str):
+    """Get a document by id"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM documents WHERE id = ?", (document_id,))
+        return cursor.fetchone()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def get_latest_document_id(user_email: str):
+    """Get the id of a user's most recently uploaded document"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id FROM documents WHERE user_email = ? ORDER BY created_at DESC, rowid DESC LIMIT 1",
+            (user_email,)
+        )
+        row = cursor.fetchone()
+        return row["id"] if row else None
+
+@timed_call(DB_CALL_SECONDS, "db")
+def list_documents(user_email: str):
+    """List a user's documents without their content"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, filename, size, created_at FROM documents WHERE user_email = ? ORDER BY created_at DESC, rowid DESC",
+            (user_email,)
+        )
+        return cursor.fetchall()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def create_job(job_id: str, user_email: str, kind: str, dedup_key: str, payload: str):
+    """Create a queued background job"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO jobs (id, user_email, kind, dedup_key, payload, status) VALUES (?, ?, ?, ?, ?, 'queued')",
+            (job_id, user_email, kind, dedup_key, payload)
+        )
+        conn.commit()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def get_job(job_id: str):
+    """Get a job by id"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return cursor.fetchone()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def find_active_job(dedup_key: str):
+    """Get a queued or running job with the same dedup key"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM jobs WHERE dedup_key = ? AND status IN ('queued', 'running') ORDER BY created_at LIMIT 1",
+            (dedup_key,)
+        )
+        return cursor.fetchone()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def get_queued_jobs():
+    """Get every job waiting for a worker"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at")
+        return cursor.fetchall()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def claim_job(job_id: str, owner: str, lease_expires_at: float) -> bool:
+    """Atomically take a queued job for one worker; False if another worker got it first"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE jobs SET status = 'running', owner = ?, lease_expires_at = ?, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = ? AND status = 'queued'",
+            (owner, lease_expires_at, job_id)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+
+@timed_call(DB_CALL_SECONDS, "db")
+def renew_job_leases(owner: str, lease_expires_at: float):
+    """Extend the leases of every job a worker is running"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE owner = ? AND status = 'running'", (lease_expires_at, owner)
+        )
+        conn.commit()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def requeue_expired_jobs(now: float) -> int:
+    """Put running jobs whose worker stopped renewing the lease back in the queue"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE jobs SET status = 'queued', owner = NULL, lease_expires_at = NULL, updated_at = CURRENT_TIMESTAMP "
+            "WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+            (now,)
+        )
+        conn.commit()
+        return cursor.rowcount
+
+@timed_call(DB_CALL_SECONDS, "db")
+def delete_finished_jobs(older_than_seconds: float) -> int:
+    """Delete done and failed jobs, with their result blobs, that finished before the cutoff"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < datetime('now', ?)",
+            (f"-{int(older_than_seconds)} seconds",)
+        )
+        conn.commit()
+        return cursor.rowcount
+
+@timed_call(DB_CALL_SECONDS, "db")
+def update_job_status(job_id: str, status: str, attempts: int = None, error: str = None):
+    """Update a job's status, attempt count and error"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE jobs SET status = ?, attempts = COALESCE(?, attempts), error = ?, "
+            "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (status, attempts, error, job_id)
+        )
+        conn.commit()
+
+@timed_call(DB_CALL_SECONDS, "db")
+def save_job_result(job_id: str, result: bytes, media_type: str):
+    """Store a finished job's result and mark it done"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE jobs SET status = 'done', result = ?, media_type = ?, error = NULL, "
+            "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (result, media_type, job_id)
+        )
+        conn.commit()
\ No newline at end of file
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from metrics import UPLOAD_PARSE_SECONDS, UPLOAD_PARSE_ERRORS, timed
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+PARSER_PROCESSES = int(os.getenv("PARSER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "20"))
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+PDF_TYPE = "application/pdf"
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PPTX_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+ZIP_TYPES = ("application/zip", "application/x-zip-compressed")
+CONTENT_TYPES_BY_EXTENSION = {
+    ".pdf": PDF_TYPE,
+    ".docx": DOCX_TYPE,
+    ".pptx": PPTX_TYPE,
+    ".txt": "text/plain",
+    ".md": "text/markdown",
+}
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # Forking a threaded server can deadlock children; start them from a clean process
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PARSER_PROCESSES, mp_context=multiprocessing.get_context(method)
+        )
+    return _process_pool
+
+# Worker functions run in the parser processes and only receive a file path
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> Tuple[List[str], int]:
+    import PyPDF2
+    reader = PyPDF2.PdfReader(path)
+    page_count = len(reader.pages)
+    return [reader.pages[i].extract_text() or "" for i in range(start, min(end, page_count))], page_count
+
+def _extract_docx(path: str) -> List[str]:
+    from docx import Document
+    return [para.text for para in Document(path).paragraphs]
+
+def _extract_pptx(path: str) -> List[str]:
+    from pptx import Presentation
+    slides = []
+    for slide in Presentation(path).slides:
+        slides.append("\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text")))
+    return slides
+
+def _import_parsers():
+    import PyPDF2, docx, pptx  # noqa: F401
+
+def warm_up():
+    """Start the parser processes and import the parser libraries in them ahead of the first upload"""
+    pool = _get_process_pool()
+    for future in [pool.submit(_import_parsers) for _ in range(PARSER_PROCESSES)]:
+        future.result()
+
+def _read_text(path: str) -> List[str]:
+    with open(path, "rb") as f:
+        return [f.read().decode("utf-8")]
+
+def _copy_with_cap(source, destination, max_bytes: int) -> int:
+    total = 0
+    while True:
+        block = source.read(SPOOL_CHUNK_BYTES)
+        if not block:
+            return total
+        total += len(block)
+        if total > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File too large. Maximum upload size is {max_bytes // (1024 * 1024)} MB."
+            )
+        destination.write(block)
+
+async def spool_upload(file: UploadFile, max_bytes: Optional[int] = None) -> str:
+    """Copy an upload to a temporary file on disk in fixed-size blocks, enforcing the size cap"""
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    suffix = os.path.splitext(file.filename or "")[1]
+    spooled = tempfile.NamedTemporaryFile(prefix="upload-", suffix=suffix, delete=False)
+    try:
+        with spooled:
+            await run_in_threadpool(_copy_with_cap, file.file, spooled, max_bytes)
+    except Exception:
+        os.unlink(spooled.name)
+        raise
+    return spooled.name
+
+async def _extract_pdf(path: str) -> List[str]:
+    loop = asyncio.get_running_loop()
+    pool = _get_process_pool()
+    # The first range also reports the page count, so short PDFs are opened only once
+    first_pages, page_count = await loop.run_in_executor(pool, _extract_pdf_pages, path, 0, PDF_PAGES_PER_TASK)
+    parts = await asyncio.gather(*[
+        loop.run_in_executor(pool, _extract_pdf_pages, path, start, start + PDF_PAGES_PER_TASK)
+        for start in range(PDF_PAGES_PER_TASK, page_count, PDF_PAGES_PER_TASK)
+    ])
+    return first_pages + [page for pages, _ in parts for page in pages]
+
+async def extract_sections(path: str, content_type: str) -> List[str]:
+    """Extract text sections (pages, paragraphs or slides) from a spooled upload off the event loop"""
+    loop = asyncio.get_running_loop()
+    if content_type == PDF_TYPE:
+        label, run = "PDF parsing error", _extract_pdf(path)
+    elif content_type == DOCX_TYPE:
+        label, run = "DOCX parsing error", loop.run_in_executor(_get_process_pool(), _extract_docx, path)
+    elif content_type == PPTX_TYPE:
+        label, run = "PPTX parsing error", loop.run_in_executor(_get_process_pool(), _extract_pptx, path)
+    else:
+        label, run = "Text file decoding error", run_in_threadpool(_read_text, path)
+    parse_format = {PDF_TYPE: "pdf", DOCX_TYPE: "docx", PPTX_TYPE: "pptx"}.get(content_type, "text")
+    try:
+        with timed(UPLOAD_PARSE_SECONDS, "parse", format=parse_format):
+            return await run
+    except Exception as e:
+        UPLOAD_PARSE_ERRORS.inc(format=parse_format)
+        logger.error(f"{label}: {e}")
+        detail = {
+            PDF_TYPE: "Failed to parse PDF file.",
+            DOCX_TYPE: "Failed to parse DOCX file.",
+            PPTX_TYPE: "Failed to parse PPTX file.",
+        }.get(content_type, "Failed to decode text file.")
+        raise HTTPException(status_code=400, detail=detail)
+
+def content_type_for(filename: str, declared: Optional[str] = None) -> str:
+    """Use the declared content type when it is specific, otherwise go by file extension"""
+    if declared and declared != "application/octet-stream":
+        return declared
+    return CONTENT_TYPES_BY_EXTENSION.get(os.path.splitext(filename or "")[1].lower(), declared or "")
+
+def is_archive(filename: str, content_type: Optional[str]) -> bool:
+    return content_type in ZIP_TYPES or (filename or "").lower().endswith(".zip")
+
+def remove_unpacked(unpacked: List[Tuple[str, str, str]]):
+    """Delete the temporary files created by unpack_archive"""
+    for _, path, _ in unpacked:
+        os.unlink(path)
+
+def unpack_archive(path: str, max_members: int, max_bytes: Optional[int] = None) -> List[Tuple[str, str, str]]:
+    """Copy the supported documents in a zip archive to temporary files as (name, path, content_type)"""
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    unpacked = []
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                content_type = content_type_for(name)
+                if info.is_dir() or name.startswith("__MACOSX/") or content_type not in CONTENT_TYPES_BY_EXTENSION.values():
+                    continue
+                if len(unpacked) == max_members:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Too many documents. A batch can contain at most {max_members}."
+                    )
+                member = tempfile.NamedTemporaryFile(prefix="upload-", suffix=os.path.splitext(name)[1], delete=False)
+                unpacked.append((name, member.name, content_type))
+                # Copy with the same cap as uploads; the sizes in the zip header can't be trusted
+                with member, archive.open(info) as source:
+                    _copy_with_cap(source, member, max_bytes)
+    except zipfile.BadZipFile:
+        remove_unpacked(unpacked)
+        raise HTTPException(status_code=400, detail="Failed to read zip archive.")
+    except Exception:
+        remove_unpacked(unpacked)
+        raise
+    return unpacked
+
+async def extract_upload(file: UploadFile) -> List[str]:
+    """Spool an upload to disk and extract its text sections"""
+    content_type = content_type_for(file.filename, file.content_type)
+    if content_type not in (PDF_TYPE, DOCX_TYPE, PPTX_TYPE) and not content_type.startswith("text/"):
+        logger.warning(f"Unsupported file type: {content_type}")
+        raise HTTPException(status_code=400, detail="Unsupported file type. Please upload PDF, PPTX, DOCX, or text files.")
+    path = await spool_upload(file)
+    try:
+        return await extract_sections(path, content_type)
+    finally:
+        os.unlink(path)
+
+def join_sections(sections: List[str]) -> str:
+    """Join extracted sections into the document text, separated by page breaks so they can be split again"""
+    return "\n\f".join(sections) + "\n"
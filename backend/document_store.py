@@ -0,0 +1,150 @@
+import hashlib
+import os
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import numpy as np
+from chunking import section_hashes, changed_sections
+from database import (
+    save_document, get_document, get_latest_document_id, get_section_hashes, get_previous_version_id,
+    get_version_ids, save_document_signature, get_canonical_signatures, get_document_source
+)
+from similarity import MinHashIndex, minhash_signature
+
+DOCUMENT_CACHE_MAX_ENTRIES = int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", "32"))
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+def content_hash_for(content: str) -> str:
+    """Hash document text for deduplication"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+class DocumentStore:
+    """Uploaded documents persisted in SQLite as compressed blobs, with a small LRU in front"""
+
+    def __init__(self, max_entries: int = DOCUMENT_CACHE_MAX_ENTRIES, max_bytes: int = DOCUMENT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self._near_duplicates = None
+        self._index_lock = threading.Lock()
+
+    def _remember(self, document_id: str, user_email: str, content: str):
+        size = len(content)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if document_id in self._cache:
+                self._cache.move_to_end(document_id)
+                return
+            self._cache[document_id] = (user_email, content)
+            self._cached_bytes += size
+            while len(self._cache) > self.max_entries or self._cached_bytes > self.max_bytes:
+                _, (_, evicted) = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    def save(self, user_email: str, filename: str, content: str) -> str:
+        """Persist a document and return its id"""
+        document_id = uuid.uuid4().hex
+        raw = content.encode("utf-8")
+        save_document(
+            document_id, user_email, filename, content_hash_for(content), zlib.compress(raw, 6), len(raw),
+            section_hashes(content)
+        )
+        self._remember(document_id, user_email, content)
+        self._match_near_duplicate(document_id, user_email, filename, content)
+        return document_id
+
+    def _index(self) -> MinHashIndex:
+        # Built from the database on first use so restarts keep matching earlier uploads
+        with self._index_lock:
+            if self._near_duplicates is None:
+                index = MinHashIndex()
+                for row in get_canonical_signatures():
+                    index.add(row["document_id"], np.frombuffer(row["signature"], dtype=np.uint64))
+                self._near_duplicates = index
+            return self._near_duplicates
+
+    def _match_near_duplicate(self, document_id: str, user_email: str, filename: str, content: str):
+        """Record which earlier document, if any, a new upload is a near-duplicate of"""
+        signature = minhash_signature(content)
+        if signature is None:
+            return
+        index = self._index()
+        # An edited re-upload of the user's own file must be generated from its new text
+        match = index.query(signature, exclude=get_version_ids(user_email, filename))
+        canonical_id, similarity = match if match else (document_id, 1.0)
+        save_document_signature(document_id, canonical_id, similarity, signature.tobytes())
+        if match is None:
+            index.add(document_id, signature)
+
+    def _content(self, document_id: str) -> Optional[Tuple[str, str]]:
+        """Return (owner email, content) for any document"""
+        with self._lock:
+            cached = self._cache.get(document_id)
+            if cached is not None:
+                self._cache.move_to_end(document_id)
+        if cached is not None:
+            return cached
+        row = get_document(document_id)
+        if row is None:
+            return None
+        content = zlib.decompress(row["content"]).decode("utf-8")
+        self._remember(document_id, row["user_email"], content)
+        return row["user_email"], content
+
+    def load(self, user_email: str, document_id: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """Return (document_id, content) for a user's document, defaulting to their latest upload"""
+        if document_id is None:
+            document_id = get_latest_document_id(user_email)
+            if document_id is None:
+                return None
+        document = self._content(document_id)
+        if document is None or document[0] != user_email:
+            return None
+        return document_id, document[1]
+
+    def load_source(self, user_email: str, document_id: Optional[str] = None) -> Optional[Tuple[str, str, str]]:
+        """Return (document_id, content, source_content) for a user's document.
+
+        The source is the earlier document this one is a near-duplicate of, otherwise the document itself.
+        Its text only keys generation cache lookups; generations and retrieval always use the user's content.
+        """
+        document = self.load(user_email, document_id)
+        if document is None:
+            return None
+        document_id, content = document
+        source = get_document_source(document_id)
+        if source is not None and source["canonical_id"] != document_id:
+            canonical = self._content(source["canonical_id"])
+            if canonical is not None:
+                return document_id, content, canonical[1]
+        return document_id, content, content
+
+    def near_duplicate_similarity(self, document_id: str) -> Optional[float]:
+        """Similarity to the earlier document a document reuses, or None if it reuses none"""
+        source = get_document_source(document_id)
+        if source is None or source["canonical_id"] == document_id:
+            return None
+        return source["similarity"]
+
+    def diff_with_previous(self, user_email: str, filename: str,
+                           document_id: str) -> Optional[Tuple[str, List[int], int, int]]:
+        """Compare a document with the previous upload of the same file.
+
+        Returns (previous_document_id, positions of changed sections, removed section count, section count),
+        or None for a first upload. The counts are informational: documents that fit in one prompt are
+        regenerated in full after any edit, since per-section reuse only applies to map-reduce chunks.
+        """
+        previous_id = get_previous_version_id(user_email, filename, document_id)
+        if previous_id is None:
+            return None
+        previous = get_section_hashes(previous_id)
+        current = get_section_hashes(document_id)
+        changed = changed_sections(previous, current)
+        return previous_id, changed, len(previous) - (len(current) - len(changed)), len(current)
+
+document_store = DocumentStore()
@@ -1,69 +1,113 @@
-from pptx import Presentation
-from pptx.util import Inches
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
+import asyncio
+import functools
+import hashlib
 import io
+import itertools
+import json
+import multiprocessing
 import os
-from typing import List
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from models import QuizQuestion
+from metrics import EXPORT_RENDER_SECONDS, EXPORT_CACHE_LOOKUPS, timed, timed_call
 
-def create_powerpoint(summary: List[str], quiz: List[QuizQuestion]) -> bytes:
-    """Create PowerPoint presentation"""
+EXPORT_CACHE_MAX_ENTRIES = int(os.getenv("EXPORT_CACHE_MAX_ENTRIES", "256"))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+EXPORT_PROCESSES = int(os.getenv("EXPORT_PROCESSES", str(min(2, os.cpu_count() or 1))))
+STREAM_CHUNK_BYTES = 64 * 1024
+QUESTIONS_PER_SLIDE = int(os.getenv("QUESTIONS_PER_SLIDE", "3"))
+MAX_QUESTIONS_PER_SLIDE = 10
+# Points
+QUIZ_FONT_SIZE = 14
+SUMMARY_FONT_SIZE = 18
+
+PPTX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+PDF_MEDIA_TYPE = "application/pdf"
+
+@functools.lru_cache(maxsize=1)
+def _pptx_template() -> bytes:
+    """Blank deck with the title slide already laid out, loaded once per process"""
+    # python-pptx and reportlab are imported on first render so importing this module stays cheap
+    from pptx import Presentation
     prs = Presentation()
-    
-    # Title slide
-    slide_layout = prs.slide_layouts[0]  # Title slide layout
-    slide = prs.slides.add_slide(slide_layout)
-    title = slide.shapes.title
-    subtitle = slide.placeholders[1]
-    
-    title.text = "AI Lesson Converter"
-    subtitle.text = "Generated Lesson Summary & Quiz"
+    slide = prs.slides.add_slide(prs.slide_layouts[0])  # Title slide layout
+    slide.shapes.title.text = "AI Lesson Converter"
+    slide.placeholders[1].text = "Generated Lesson Summary & Quiz"
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+@functools.lru_cache(maxsize=1)
+def _pdf_styles():
+    """getSampleStyleSheet builds every style from scratch, so build it once per process"""
+    from reportlab.lib.styles import getSampleStyleSheet
+    return getSampleStyleSheet()
+
+def _add_paragraph(text_frame, text: str, level: int = 0, first: bool = False, size=QUIZ_FONT_SIZE):
+    from pptx.util import Pt
+    paragraph = text_frame.paragraphs[0] if first else text_frame.add_paragraph()
+    paragraph.text = text
+    paragraph.level = level
+    paragraph.font.size = Pt(size)
+
+def _add_quiz_slide(prs, layout, questions: Iterable[Tuple[int, QuizQuestion]], heading: str):
+    slide = prs.slides.add_slide(layout)
+    slide.shapes.title.text = heading
+    text_frame = slide.placeholders[1].text_frame
+    first = True
+    for number, q in questions:
+        _add_paragraph(text_frame, f"Q{number}: {q.question}", first=first)
+        first = False
+        for j, option in enumerate(q.options):
+            _add_paragraph(text_frame, f"{chr(65+j)}) {option}", level=1)
+        _add_paragraph(text_frame, f"Correct: {q.correct_answer}", level=1)
+
+@timed_call(EXPORT_RENDER_SECONDS, "render", format="pptx")
+def create_powerpoint(summary: List[str], quiz: Iterable[QuizQuestion],
+                      questions_per_slide: int = QUESTIONS_PER_SLIDE) -> bytes:
+    """Create PowerPoint presentation with the quiz split across slides"""
+    from pptx import Presentation
+    # Title slide comes with the template
+    prs = Presentation(io.BytesIO(_pptx_template()))
     
     # Summary slide
     slide_layout = prs.slide_layouts[1]  # Content slide
     slide = prs.slides.add_slide(slide_layout)
-    title = slide.shapes.title
-    content = slide.placeholders[1]
-    
-    title.text = "Lesson Summary"
-    
-    summary_text = ""
+    slide.shapes.title.text = "Lesson Summary"
+    content = slide.placeholders[1].text_frame
     for i, point in enumerate(summary, 1):
-        summary_text += f"{i}. {point}\n\n"
-    
-    content.text = summary_text
-    
-    # Quiz slide
-    slide = prs.slides.add_slide(slide_layout)
-    title = slide.shapes.title
-    content = slide.placeholders[1]
-    
-    title.text = "Quiz Questions"
-    
-    quiz_text = ""
-    for i, q in enumerate(quiz, 1):
-        quiz_text += f"Q{i}: {q.question}\n"
-        for j, option in enumerate(q.options):
-            quiz_text += f"  {chr(65+j)}) {option}\n"
-        quiz_text += f"Correct: {q.correct_answer}\n\n"
-    
-    content.text = quiz_text
+        _add_paragraph(content, f"{i}. {point}", first=i == 1, size=SUMMARY_FONT_SIZE)
+    
+    # Quiz slides, filled a page at a time straight from the questions so large banks are never copied
+    total_pages = -(-len(quiz) // questions_per_slide) if hasattr(quiz, "__len__") else None
+    numbered = enumerate(quiz, 1)
+    page = 0
+    while True:
+        questions = list(itertools.islice(numbered, questions_per_slide))
+        if not questions:
+            break
+        page += 1
+        heading = "Quiz Questions" if total_pages == 1 else (
+            f"Quiz Questions ({page}/{total_pages})" if total_pages else f"Quiz Questions ({page})"
+        )
+        _add_quiz_slide(prs, slide_layout, questions, heading)
     
     # Save to bytes
     ppt_bytes = io.BytesIO()
     prs.save(ppt_bytes)
-    ppt_bytes.seek(0)
-    
     return ppt_bytes.getvalue()
 
+@timed_call(EXPORT_RENDER_SECONDS, "render", format="pdf")
 def create_pdf(summary: List[str], quiz: List[QuizQuestion]) -> bytes:
     """Create PDF document"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
+    styles = _pdf_styles()
     story = []
     
     # Title
@@ -103,4 +147,108 @@ def create_pdf(summary: List[str], quiz: List[QuizQuestion]) -> bytes:
     doc.build(story)
     buffer.seek(0)
     
-    return buffer.getvalue()
\ No newline at end of file
+    return buffer.getvalue()
+class RenderCache:
+    """LRU cache of rendered export bytes, bounded by entries and total size"""
+
+    def __init__(self, max_entries: int = EXPORT_CACHE_MAX_ENTRIES, max_bytes: int = EXPORT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return
+            self._cache[key] = data
+            self._cached_bytes += len(data)
+            while len(self._cache) > self.max_entries or self._cached_bytes > self.max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+render_cache = RenderCache()
+
+RENDERERS = {
+    "pptx": create_powerpoint,
+    "pdf": create_pdf,
+}
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+# Renders in progress on this loop, so simultaneous requests for the same lesson render it once
+_in_flight: Dict[str, asyncio.Future] = {}
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _process_pool = ProcessPoolExecutor(max_workers=EXPORT_PROCESSES, mp_context=multiprocessing.get_context(method))
+    return _process_pool
+
+def _load_renderers():
+    _pptx_template()
+    _pdf_styles()
+
+def warm_up():
+    """Import the renderers and build the templates here and in the render processes ahead of the first export"""
+    _load_renderers()
+    pool = _get_process_pool()
+    for future in [pool.submit(_load_renderers) for _ in range(EXPORT_PROCESSES)]:
+        future.result()
+
+def render_key(export_format: str, summary: List[str], quiz: List[QuizQuestion], **options) -> str:
+    """Hash the export format, summary, quiz and layout options into a render cache key"""
+    payload = json.dumps([export_format, summary, [q.dict() for q in quiz], sorted(options.items())])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def render_export_sync(export_format: str, summary: List[str], quiz: List[QuizQuestion], **options) -> bytes:
+    """Render an export in the calling thread, reusing cached output (for background workers)"""
+    key = render_key(export_format, summary, quiz, **options)
+    data = render_cache.get(key)
+    EXPORT_CACHE_LOOKUPS.inc(format=export_format, result="hit" if data is not None else "miss")
+    if data is None:
+        data = RENDERERS[export_format](summary, quiz, **options)
+        render_cache.put(key, data)
+    return data
+
+async def render_export(export_format: str, summary: List[str], quiz: List[QuizQuestion], **options) -> bytes:
+    """Render an export in the process pool, reusing cached output and renders already in progress"""
+    key = render_key(export_format, summary, quiz, **options)
+    data = render_cache.get(key)
+    if data is not None:
+        EXPORT_CACHE_LOOKUPS.inc(format=export_format, result="hit")
+        return data
+    in_flight = _in_flight.get(key)
+    if in_flight is not None and in_flight.get_loop() is asyncio.get_running_loop():
+        EXPORT_CACHE_LOOKUPS.inc(format=export_format, result="in_flight")
+        return await asyncio.shield(in_flight)
+    EXPORT_CACHE_LOOKUPS.inc(format=export_format, result="miss")
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        _get_process_pool(), functools.partial(RENDERERS[export_format], summary, quiz, **options)
+    )
+    _in_flight[key] = future
+    try:
+        with timed(EXPORT_RENDER_SECONDS, "render", format=export_format):
+            data = await asyncio.shield(future)
+    finally:
+        _in_flight.pop(key, None)
+    render_cache.put(key, data)
+    return data
+
+def iter_chunks(data: bytes, chunk_size: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """Yield rendered bytes in fixed-size pieces for a streaming response"""
+    view = memoryview(data)
+    for start in range(0, len(data), chunk_size):
+        yield bytes(view[start:start + chunk_size])
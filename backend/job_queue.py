@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+import ai_service
+from database import (
+    create_job, get_job, find_active_job, get_queued_jobs, update_job_status, save_job_result,
+    claim_job, renew_job_leases, requeue_expired_jobs, delete_finished_jobs
+)
+from document_store import document_store
+from export_service import render_export_sync, PPTX_MEDIA_TYPE, PDF_MEDIA_TYPE
+from models import QuizQuestion, QuizResponse
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "1"))
+# A running job is renewed well within its lease; if its worker dies the lease runs out and it is requeued
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+# Finished jobs and their result blobs are deleted this long after they finish
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", str(24 * 3600)))
+
+# Names this process in job leases so sibling workers sharing the database never run the same job
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_submit_lock = threading.Lock()
+# Jobs waiting in or running on this process's pool
+_local_jobs = set()
+_local_jobs_lock = threading.Lock()
+_maintenance = None
+
+def _load_content(payload: dict) -> str:
+    document = document_store.load(payload["user_email"], payload["document_id"])
+    if document is None:
+        raise LookupError(f"Document {payload['document_id']} no longer exists")
+    return document[1]
+
+def _summary_and_quiz(payload: dict):
+    content = _load_content(payload)
+    summary = payload.get("summary") or ai_service.generate_summary(content)
+    if payload.get("quiz"):
+        quiz = [QuizQuestion(**q) for q in payload["quiz"]]
+    else:
+        quiz = ai_service.generate_quiz(content)
+    return summary, quiz
+
+def _run_quiz(payload: dict) -> Tuple[bytes, str]:
+    quiz = ai_service.generate_quiz(_load_content(payload))
+    return json.dumps(QuizResponse(quiz=quiz).dict()).encode("utf-8"), "application/json"
+
+def _run_export_ppt(payload: dict) -> Tuple[bytes, str]:
+    summary, quiz = _summary_and_quiz(payload)
+    return render_export_sync("pptx", summary, quiz), PPTX_MEDIA_TYPE
+
+def _run_export_pdf(payload: dict) -> Tuple[bytes, str]:
+    summary, quiz = _summary_and_quiz(payload)
+    return render_export_sync("pdf", summary, quiz), PDF_MEDIA_TYPE
+
+JOB_HANDLERS: Dict[str, Callable[[dict], Tuple[bytes, str]]] = {
+    "quiz": _run_quiz,
+    "export_ppt": _run_export_ppt,
+    "export_pdf": _run_export_pdf,
+}
+
+JOB_FILENAMES = {
+    "quiz": "quiz.json",
+    "export_ppt": "lesson.pptx",
+    "export_pdf": "lesson.pdf",
+}
+
+def make_dedup_key(user_email: str, kind: str, document_id: str) -> str:
+    """Identify jobs that would produce the same result"""
+    return hashlib.sha256(f"{user_email}:{kind}:{document_id}".encode("utf-8")).hexdigest()
+
+def _run_job(job_id: str, kind: str, payload: dict):
+    try:
+        if not claim_job(job_id, WORKER_ID, time.time() + JOB_LEASE_SECONDS):
+            # Another worker claimed it first
+            return
+        handler = JOB_HANDLERS[kind]
+        for attempt in range(1, JOB_MAX_ATTEMPTS + 1):
+            update_job_status(job_id, "running", attempts=attempt)
+            try:
+                result, media_type = handler(payload)
+                save_job_result(job_id, result, media_type)
+                logger.info(f"Job {job_id} ({kind}) finished on attempt {attempt}")
+                return
+            except Exception as e:
+                logger.error(f"Job {job_id} ({kind}) attempt {attempt} failed: {e}")
+                if attempt == JOB_MAX_ATTEMPTS:
+                    update_job_status(job_id, "failed", error=str(e))
+                    return
+                time.sleep(JOB_RETRY_BACKOFF_SECONDS * attempt)
+    finally:
+        with _local_jobs_lock:
+            _local_jobs.discard(job_id)
+
+def _maintain():
+    while True:
+        time.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            renew_job_leases(WORKER_ID, time.time() + JOB_LEASE_SECONDS)
+            recover_jobs()
+        except Exception as e:
+            logger.error(f"Job maintenance failed: {e}")
+
+def _start_maintenance():
+    global _maintenance
+    with _local_jobs_lock:
+        if _maintenance is None:
+            _maintenance = threading.Thread(target=_maintain, name="job-maintenance", daemon=True)
+            _maintenance.start()
+
+def _enqueue(job_id: str, kind: str, payload: dict):
+    _start_maintenance()
+    with _local_jobs_lock:
+        if job_id in _local_jobs:
+            return
+        _local_jobs.add(job_id)
+    _executor.submit(_run_job, job_id, kind, payload)
+
+def submit_job(user_email: str, kind: str, document_id: str, payload: dict) -> str:
+    """Queue a job, or return the id of an identical job that is still in flight"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    dedup_key = make_dedup_key(user_email, kind, document_id)
+    with _submit_lock:
+        existing = find_active_job(dedup_key)
+        if existing:
+            return existing["id"]
+        job_id = uuid.uuid4().hex
+        create_job(job_id, user_email, kind, dedup_key, json.dumps(payload))
+    _enqueue(job_id, kind, payload)
+    return job_id
+
+def recover_jobs():
+    """Requeue jobs whose worker died, pick up queued jobs and prune finished ones past their TTL"""
+    # Always watch leases, even with nothing to run here: a dead sibling's lease may still be live
+    _start_maintenance()
+    requeued = requeue_expired_jobs(time.time())
+    if requeued:
+        logger.info(f"Requeued {requeued} jobs whose lease expired")
+    for job in get_queued_jobs():
+        _enqueue(job["id"], job["kind"], json.loads(job["payload"]))
+    delete_finished_jobs(JOB_RESULT_TTL_SECONDS)
+
+def get_job_for_user(job_id: str, user_email: str):
+    """Get a job if it belongs to the user"""
+    job = get_job(job_id)
+    if job is None or job["user_email"] != user_email:
+        return None
+    return job
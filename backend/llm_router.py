@@ -0,0 +1,220 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Optional
+from metrics import LLM_BACKEND_SECONDS, LLM_HEDGED_REQUESTS, LLM_FAILOVERS, LLM_CIRCUIT_OPENS
+
+logger = logging.getLogger(__name__)
+
+# Send a duplicate request once a call runs past this percentile of the backend's recent latency
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Hedge delay until a backend has enough samples for a percentile
+LLM_HEDGE_DEFAULT_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_SECONDS", "10"))
+LLM_HEDGE_MIN_SAMPLES = 20
+# At most this fraction of calls may send a hedge, so a slow provider doesn't double the load on it
+LLM_HEDGE_MAX_FRACTION = float(os.getenv("LLM_HEDGE_MAX_FRACTION", "0.1"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+LLM_LATENCY_WINDOW = 200
+LLM_ROUTER_WORKERS = int(os.getenv("LLM_ROUTER_WORKERS", "32"))
+
+class NoBackendAvailable(RuntimeError):
+    """Every backend's circuit breaker is open"""
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single trial call through once the reset time passes"""
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may be sent now; claims the trial call when half-open"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> bool:
+        """Count a failure and return True if it opened the breaker"""
+        with self._lock:
+            self.failures += 1
+            was_open = self.opened_at is not None
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+            return not was_open and self.opened_at is not None
+
+class Backend:
+    """One model behind the router, with its own circuit breaker and latency history"""
+
+    def __init__(self, name: str, model, breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.model = model
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=LLM_LATENCY_WINDOW)
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile of recent successful call latencies, or None without enough samples"""
+        latencies = sorted(self._latencies)
+        if len(latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))]
+
+    def _record(self, started: float, ok: bool):
+        elapsed = time.perf_counter() - started
+        if ok:
+            self._latencies.append(elapsed)
+            LLM_BACKEND_SECONDS.observe(elapsed, backend=self.name)
+            self.breaker.record_success()
+        elif self.breaker.record_failure():
+            LLM_CIRCUIT_OPENS.inc(backend=self.name)
+            logger.warning(f"Circuit breaker opened for LLM backend {self.name}")
+
+    def call(self, prompt: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.model.generate_content(prompt, **kwargs)
+            # Touch the text so a blocked or empty response counts as a failure here, not in the caller
+            response.text
+        except Exception:
+            self._record(started, ok=False)
+            raise
+        self._record(started, ok=True)
+        return response
+
+    def stream(self, prompt: str, **kwargs) -> Iterator:
+        started = time.perf_counter()
+        try:
+            for chunk in self.model.generate_content(prompt, stream=True, **kwargs):
+                yield chunk
+        except Exception:
+            self._record(started, ok=False)
+            raise
+        self._record(started, ok=True)
+
+class LLMRouter:
+    """Routes generate_content calls over backends in priority order.
+
+    A call that runs past the backend's latency percentile sends a hedged duplicate to the next
+    backend (or the same one if it is the only one) and returns whichever answers first. Failed
+    calls fail over to the next backend, and backends whose circuit breaker is open are skipped.
+    """
+
+    def __init__(self, backends: List[Backend], hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+                 hedge_default_seconds: float = LLM_HEDGE_DEFAULT_SECONDS,
+                 hedge_max_fraction: float = LLM_HEDGE_MAX_FRACTION, workers: int = LLM_ROUTER_WORKERS):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default_seconds = hedge_default_seconds
+        self.hedge_max_fraction = hedge_max_fraction
+        self._calls = 0
+        self._hedges = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-router")
+
+    def _hedge_delay(self, backend: Backend) -> float:
+        delay = backend.latency_percentile(self.hedge_percentile)
+        return self.hedge_default_seconds if delay is None else delay
+
+    def _claim_hedge(self) -> bool:
+        with self._lock:
+            if self._hedges > self.hedge_max_fraction * self._calls:
+                return False
+            self._hedges += 1
+            return True
+
+    def _next_backend(self, candidates: List[Backend]) -> Optional[Backend]:
+        while candidates:
+            backend = candidates.pop(0)
+            if backend.breaker.allow():
+                return backend
+        return None
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        """Same interface as a Gemini GenerativeModel"""
+        if stream:
+            return self._stream(prompt, **kwargs)
+        with self._lock:
+            self._calls += 1
+        candidates = list(self.backends)
+        primary = self._next_backend(candidates)
+        if primary is None:
+            raise NoBackendAvailable("Every LLM backend's circuit breaker is open")
+        pending = {self._executor.submit(primary.call, prompt, **kwargs): primary}
+        hedged = False
+        error = None
+        while pending:
+            timeout = None if hedged else self._hedge_delay(primary)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                if self._claim_hedge():
+                    # Fall back to a second request to the same backend when there is no other
+                    backend = self._next_backend(candidates) or (primary if primary.breaker.allow() else None)
+                    if backend is not None:
+                        LLM_HEDGED_REQUESTS.inc(backend=backend.name)
+                        pending[self._executor.submit(backend.call, prompt, **kwargs)] = backend
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    logger.warning(f"LLM backend {backend.name} failed: {e}")
+                    error = e
+            if not pending:
+                backend = self._next_backend(candidates)
+                if backend is not None:
+                    LLM_FAILOVERS.inc(backend=backend.name)
+                    pending[self._executor.submit(backend.call, prompt, **kwargs)] = backend
+        raise error
+
+    def _stream(self, prompt: str, **kwargs) -> Iterator:
+        """Stream from the first healthy backend, failing over only until the first chunk arrives"""
+        candidates = list(self.backends)
+        error = None
+        backend = self._next_backend(candidates)
+        while backend is not None:
+            started = False
+            try:
+                for chunk in backend.stream(prompt, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise
+                logger.warning(f"LLM backend {backend.name} failed to stream: {e}")
+                error = e
+            backend = self._next_backend(candidates)
+            if backend is not None:
+                LLM_FAILOVERS.inc(backend=backend.name)
+        raise error or NoBackendAvailable("Every LLM backend's circuit breaker is open")
@@ -0,0 +1,172 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (100, 1000, 5000, 20000, 100000, 500000, 2000000)
+
+# Stage timings of the request being served, for the Server-Timing header
+_request_stages: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_stages", default=None
+)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts..., +Inf count], sum
+        self._series: Dict[tuple, Tuple[List[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._series[key] = (counts, total + value)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(name, "") for name in self.labelnames))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                cumulative += counts[-1]
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+UPLOAD_PARSE_SECONDS = Histogram("upload_parse_duration_seconds", "Upload text extraction time", ["format"])
+UPLOAD_PARSE_ERRORS = Counter("upload_parse_errors_total", "Uploads that failed to parse", ["format"])
+LLM_CALL_SECONDS = Histogram("llm_call_duration_seconds", "Gemini call latency", ["operation"])
+LLM_PROMPT_CHARS = Histogram("llm_prompt_chars", "Gemini prompt size in characters", ["operation"], SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = Histogram("llm_response_chars", "Gemini response size in characters", ["operation"], SIZE_BUCKETS)
+LLM_ERRORS = Counter("llm_errors_total", "Failed Gemini calls", ["operation"])
+LLM_BACKEND_SECONDS = Histogram("llm_backend_call_duration_seconds", "Successful call latency per LLM backend", ["backend"])
+LLM_HEDGED_REQUESTS = Counter("llm_hedged_requests_total", "Duplicate requests sent to beat a slow call", ["backend"])
+LLM_FAILOVERS = Counter("llm_failovers_total", "Calls retried on another backend after a failure", ["backend"])
+LLM_CIRCUIT_OPENS = Counter("llm_circuit_opens_total", "Times a backend's circuit breaker opened", ["backend"])
+LLM_MOCK_FALLBACKS = Counter("llm_mock_fallbacks_total", "Generations served from mock data", ["operation", "reason"])
+QUIZ_PARSE_SECONDS = Histogram("quiz_parse_duration_seconds", "Quiz response parsing time")
+EXPORT_RENDER_SECONDS = Histogram("export_render_duration_seconds", "Export rendering time", ["format"])
+EXPORT_CACHE_LOOKUPS = Counter("export_cache_lookups_total", "Rendered export cache lookups", ["format", "result"])
+ADMISSION_QUEUE_SECONDS = Histogram("admission_queue_wait_seconds", "Time requests waited for an LLM slot", ["kind"])
+ADMISSION_REJECTIONS = Counter("admission_rejections_total", "Requests shed by admission control", ["reason"])
+PASSWORD_HASH_SECONDS = Histogram("password_hash_duration_seconds", "Password hashing and verification time", ["operation"])
+DB_CALL_SECONDS = Histogram("db_call_duration_seconds", "Database call latency", ["operation"])
+
+REGISTRY = [
+    REQUEST_SECONDS, UPLOAD_PARSE_SECONDS, UPLOAD_PARSE_ERRORS,
+    LLM_CALL_SECONDS, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS, LLM_ERRORS, LLM_MOCK_FALLBACKS,
+    LLM_BACKEND_SECONDS, LLM_HEDGED_REQUESTS, LLM_FAILOVERS, LLM_CIRCUIT_OPENS,
+    QUIZ_PARSE_SECONDS, EXPORT_RENDER_SECONDS, EXPORT_CACHE_LOOKUPS,
+    ADMISSION_QUEUE_SECONDS, ADMISSION_REJECTIONS, PASSWORD_HASH_SECONDS, DB_CALL_SECONDS,
+]
+
+def render_metrics() -> str:
+    """Render every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def start_request_timing() -> contextvars.Token:
+    """Begin collecting stage timings for the current request"""
+    return _request_stages.set([])
+
+def finish_request_timing(token: contextvars.Token) -> List[Tuple[str, float]]:
+    """Stop collecting stage timings and return them"""
+    stages = _request_stages.get() or []
+    _request_stages.reset(token)
+    return stages
+
+def record_stage(stage: str, seconds: float):
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((stage, seconds))
+
+@contextmanager
+def timed(histogram: Histogram, stage: Optional[str] = None, **labels):
+    """Observe the duration of a block, also recording it as a request stage when named"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        if stage:
+            record_stage(stage, elapsed)
+
+def timed_call(histogram: Histogram, stage: Optional[str] = None, **labels):
+    """Decorator form of timed(); labels default to operation=<function name> when the histogram has one"""
+    def decorator(func):
+        call_labels = dict(labels)
+        if "operation" in histogram.labelnames:
+            call_labels.setdefault("operation", func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(histogram, stage, **call_labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def server_timing_header(stages: List[Tuple[str, float]], total: float) -> str:
+    """Format stage timings as a Server-Timing header, summing repeated stages"""
+    totals: Dict[str, float] = {}
+    for stage, seconds in stages:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    parts = [f"{stage};dur={duration * 1000:.1f}" for stage, duration in totals.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
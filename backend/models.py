@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -16,6 +16,18 @@ class Token(BaseModel):
 class UploadResponse(BaseModel):
     message: str
     content: str
+    document_id: Optional[str] = None
+    previous_document_id: Optional[str] = None
+    changed_sections: Optional[int] = None
+    removed_sections: Optional[int] = None
+    total_sections: Optional[int] = None
+    near_duplicate_similarity: Optional[float] = None
+
+class DocumentInfo(BaseModel):
+    document_id: str
+    filename: Optional[str] = None
+    size: int
+    created_at: str
 
 class SummaryResponse(BaseModel):
     summary: List[str]
@@ -28,10 +40,45 @@ class QuizQuestion(BaseModel):
 class QuizResponse(BaseModel):
     quiz: List[QuizQuestion]
 
+class Flashcard(BaseModel):
+    front: str
+    back: str
+
+class DeckSlide(BaseModel):
+    title: str
+    bullets: List[str]
+
+class LessonResponse(BaseModel):
+    summary: SummaryResponse
+    quiz: QuizResponse
+    flashcards: List[Flashcard]
+    deck: Optional[List[DeckSlide]] = None
+
 class AskResponse(BaseModel):
     question: str
     answer: str
 
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    attempts: int
+    error: Optional[str] = None
+
+class BatchDocumentResult(BaseModel):
+    filename: str
+    status: str
+    document_id: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    summary: Optional[List[str]] = None
+    quiz: Optional[List[QuizQuestion]] = None
+    export_jobs: Optional[Dict[str, str]] = None
+    error: Optional[str] = None
+
 class ExportResponse(BaseModel):
     filename: str
     download_url: str
\ No newline at end of file
@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import math
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+import bcrypt
+from fastapi import HTTPException, status
+from metrics import PASSWORD_HASH_SECONDS, timed
+
+logger = logging.getLogger(__name__)
+
+# Fixed bcrypt cost; when unset the cost is calibrated so one hash takes about the target time
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "0"))
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+_CALIBRATION_ROUNDS = 8
+# bcrypt holds a core for the whole hash, so run a few at a time and make the rest wait their turn
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "256"))
+# bcrypt only reads the first 72 bytes of a password
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_pending = 0
+_pending_lock = threading.Lock()
+_rounds: Optional[int] = None
+_rounds_lock = threading.Lock()
+
+def _password_bytes(password: str) -> bytes:
+    return password.encode("utf-8")[:BCRYPT_MAX_PASSWORD_BYTES]
+
+def calibrate_rounds(target_seconds: float) -> int:
+    """Pick the bcrypt cost whose hash time is closest to the target without going under the minimum"""
+    started = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=_CALIBRATION_ROUNDS))
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    # Each extra round doubles the work
+    rounds = _CALIBRATION_ROUNDS + round(math.log2(target_seconds / elapsed))
+    return max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, rounds))
+
+def current_rounds() -> int:
+    """The bcrypt cost new hashes use, calibrated on first call unless BCRYPT_ROUNDS is set"""
+    global _rounds
+    if _rounds is None:
+        with _rounds_lock:
+            if _rounds is None:
+                if BCRYPT_ROUNDS:
+                    _rounds = BCRYPT_ROUNDS
+                else:
+                    _rounds = calibrate_rounds(PASSWORD_HASH_TARGET_MS / 1000)
+                    logger.info(f"Calibrated bcrypt cost to {_rounds} rounds for ~{PASSWORD_HASH_TARGET_MS:.0f}ms hashes")
+    return _rounds
+
+def is_legacy_hash(password_hash: str) -> bool:
+    """Whether a stored hash is an unsalted SHA-256 hex digest from before bcrypt"""
+    return len(password_hash) == 64 and all(c in "0123456789abcdef" for c in password_hash)
+
+def needs_rehash(password_hash: str) -> bool:
+    """Whether a stored hash should be replaced at the next successful login"""
+    if is_legacy_hash(password_hash):
+        return True
+    try:
+        return int(password_hash.split("$")[2]) < current_rounds()
+    except (IndexError, ValueError):
+        return True
+
+def _hash(password: str) -> str:
+    with timed(PASSWORD_HASH_SECONDS, "password_hash", operation="hash"):
+        return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(rounds=current_rounds())).decode("ascii")
+
+_dummy_hash: Optional[str] = None
+
+def _verify(password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+    global _dummy_hash
+    if password_hash is None:
+        # Unknown accounts still pay for a full check so response times don't reveal which emails exist
+        if _dummy_hash is None:
+            _dummy_hash = _hash(secrets.token_urlsafe(16))
+        _verify(password, _dummy_hash)
+        return False, None
+    with timed(PASSWORD_HASH_SECONDS, "password_hash", operation="verify"):
+        if is_legacy_hash(password_hash):
+            valid = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), password_hash)
+        else:
+            try:
+                valid = bcrypt.checkpw(_password_bytes(password), password_hash.encode("ascii"))
+            except ValueError:
+                valid = False
+    if valid and needs_rehash(password_hash):
+        return True, _hash(password)
+    return valid, None
+
+def _submit(func, *args):
+    global _pending
+    with _pending_lock:
+        if _pending >= PASSWORD_HASH_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy. Please retry shortly.", headers={"Retry-After": "1"}
+            )
+        _pending += 1
+    future = _executor.submit(func, *args)
+
+    def done(_):
+        global _pending
+        with _pending_lock:
+            _pending -= 1
+
+    future.add_done_callback(done)
+    return future
+
+def hash_password(password: str) -> str:
+    """Hash a password with bcrypt on the hashing pool"""
+    return _submit(_hash, password).result()
+
+def verify_password(password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """Check a password on the hashing pool; returns (valid, replacement hash if it should be upgraded).
+
+    Pass None for an unknown account to spend the same time and return invalid.
+    """
+    return _submit(_verify, password, password_hash).result()
+
+async def ahash_password(password: str) -> str:
+    """hash_password without blocking the event loop"""
+    return await asyncio.wrap_future(_submit(_hash, password))
+
+async def averify_password(password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """verify_password without blocking the event loop"""
+    return await asyncio.wrap_future(_submit(_verify, password, password_hash))
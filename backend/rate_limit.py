@@ -0,0 +1,33 @@
+import threading
+import time
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at a fixed rate"""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Take tokens if available and return 0, otherwise return the seconds until they will be"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate_per_second
+
+    def acquire(self, tokens: float = 1):
+        """Block until tokens are available"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return
+            time.sleep(wait)
@@ -0,0 +1,117 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List
+import numpy as np
+from chunking import split_into_chunks, CHARS_PER_TOKEN
+
+RETRIEVAL_PASSAGE_TOKENS = int(os.getenv("RETRIEVAL_PASSAGE_TOKENS", "250"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+RETRIEVAL_MAX_INDEXES = int(os.getenv("RETRIEVAL_MAX_INDEXES", "256"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Unicode word characters, so Cyrillic, Arabic, Devanagari and other scripts tokenize too
+_token_re = re.compile(r"\w+")
+# Chinese and Japanese are written without spaces, so their runs are indexed as overlapping character pairs
+_cjk_re = re.compile(r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]+)")
+_stopwords = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what "
+    "when where which who why will with how does do did can".split()
+)
+
+def _cjk_bigrams(run: str) -> List[str]:
+    return [run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)]
+
+def tokenize(text: str) -> List[str]:
+    """Casefolded word tokens without stopwords"""
+    tokens = []
+    for word in _token_re.findall(text.casefold()):
+        # split() with a capturing group puts the CJK runs at odd positions
+        for i, part in enumerate(_cjk_re.split(word)):
+            if i % 2:
+                tokens.extend(_cjk_bigrams(part))
+            elif part and part not in _stopwords:
+                tokens.append(part)
+    return tokens
+
+class BM25Index:
+    """BM25 ranking over a document's passages, stored as a sparse passage x term matrix"""
+
+    def __init__(self, passages: List[str]):
+        # scipy is imported on first use to keep it off the worker startup path
+        from scipy import sparse
+        self.passages = passages
+        self.vocabulary = {}
+        rows, cols, counts = [], [], []
+        lengths = np.zeros(len(passages), dtype=np.float64)
+        for row, passage in enumerate(passages):
+            term_counts = {}
+            for token in tokenize(passage):
+                term_id = self.vocabulary.setdefault(token, len(self.vocabulary))
+                term_counts[term_id] = term_counts.get(term_id, 0) + 1
+            rows.extend([row] * len(term_counts))
+            cols.extend(term_counts.keys())
+            counts.extend(term_counts.values())
+            lengths[row] = sum(term_counts.values())
+        tf = sparse.csr_matrix(
+            (np.array(counts, dtype=np.float64), (rows, cols)),
+            shape=(len(passages), len(self.vocabulary))
+        )
+        # Precompute per-cell BM25 weights so a query is just a column sum
+        n_docs = max(len(passages), 1)
+        doc_freq = np.bincount(tf.indices, minlength=len(self.vocabulary))
+        idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_len = lengths.mean() if len(passages) else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(avg_len, 1.0))
+        row_norm = np.repeat(norm, np.diff(tf.indptr))
+        weights = tf.data * (BM25_K1 + 1) / (tf.data + row_norm) * idf[tf.indices]
+        # Column-major so selecting the query's term columns is cheap
+        self.matrix = sparse.csr_matrix((weights, tf.indices, tf.indptr), shape=tf.shape).tocsc()
+
+    @classmethod
+    def from_text(cls, text: str, passage_tokens: int = RETRIEVAL_PASSAGE_TOKENS) -> "BM25Index":
+        return cls(split_into_chunks(text, token_budget=passage_tokens))
+
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K) -> List[str]:
+        """Return the top_k passages for a query, in document order"""
+        term_ids = [self.vocabulary[t] for t in set(tokenize(query)) if t in self.vocabulary]
+        if not term_ids:
+            return self.passages[:top_k]
+        scores = np.asarray(self.matrix[:, term_ids].sum(axis=1)).ravel()
+        top_k = min(top_k, len(self.passages))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = [i for i in best if scores[i] > 0] or list(best)
+        return [self.passages[i] for i in sorted(best)]
+
+class RetrievalIndexCache:
+    """Small LRU of per-document retrieval indexes"""
+
+    def __init__(self, max_indexes: int = RETRIEVAL_MAX_INDEXES):
+        self.max_indexes = max_indexes
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, document_id: str, text: str) -> BM25Index:
+        """Return the index for a document, building it if needed"""
+        with self._lock:
+            index = self._indexes.get(document_id)
+            if index is not None:
+                self._indexes.move_to_end(document_id)
+                return index
+        index = BM25Index.from_text(text)
+        with self._lock:
+            self._indexes[document_id] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return index
+
+retrieval_indexes = RetrievalIndexCache()
+
+def build_question_context(document_id: str, text: str, question: str, top_k: int = RETRIEVAL_TOP_K) -> str:
+    """Return only the passages relevant to a question, or the whole text if it is already small"""
+    if len(text) <= RETRIEVAL_PASSAGE_TOKENS * CHARS_PER_TOKEN * top_k:
+        return text
+    passages = retrieval_indexes.get(document_id, text).search(question, top_k)
+    return "\n\n---\n\n".join(passages)
@@ -0,0 +1,87 @@
+import os
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+# Estimated Jaccard similarity of word shingles at which an upload reuses an earlier document
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+MINHASH_PERMUTATIONS = 128
+# 32 bands of 4 rows make documents above ~0.45 similarity likely candidates; the threshold is checked after
+MINHASH_BANDS = 32
+SHINGLE_WORDS = 5
+_MERSENNE_PRIME = (1 << 31) - 1
+# Shingles hashed per block, so huge documents don't build a shingles x permutations matrix at once
+_SIGNATURE_BLOCK = 4096
+
+# Unicode words; Chinese and Japanese characters each count as a word since those scripts have no spaces
+_word_re = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]|[^\W\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]+")
+_permutations = np.random.default_rng(1).integers(1, _MERSENNE_PRIME, size=(2, MINHASH_PERMUTATIONS), dtype=np.uint64)
+
+def normalized_words(text: str) -> List[str]:
+    """Casefolded words with punctuation, layout and page breaks stripped"""
+    return _word_re.findall(text.casefold())
+
+def _shingle_hashes(words: List[str]) -> np.ndarray:
+    hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    size = min(SHINGLE_WORDS, len(hashes))
+    # Polynomial hash of each run of words; uint64 arithmetic wraps, which is fine for hashing
+    with np.errstate(over="ignore"):
+        shingles = np.zeros(len(hashes) - size + 1, dtype=np.uint64)
+        for offset in range(size):
+            shingles = shingles * np.uint64(1000003) + hashes[offset:len(hashes) - size + 1 + offset]
+    return np.unique(shingles % np.uint64(_MERSENNE_PRIME))
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of a document's word shingles, or None if it has no words"""
+    words = normalized_words(text)
+    if not words:
+        return None
+    shingles = _shingle_hashes(words)
+    signature = np.full(MINHASH_PERMUTATIONS, _MERSENNE_PRIME, dtype=np.uint64)
+    a, b = _permutations
+    for start in range(0, len(shingles), _SIGNATURE_BLOCK):
+        block = shingles[start:start + _SIGNATURE_BLOCK, None]
+        signature = np.minimum(signature, ((block * a + b) % np.uint64(_MERSENNE_PRIME)).min(axis=0))
+    return signature
+
+def estimate_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(first == second)) / len(first)
+
+def _band_keys(signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+    rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    for band in range(MINHASH_BANDS):
+        yield band, signature[band * rows:(band + 1) * rows].tobytes()
+
+class MinHashIndex:
+    """Locality-sensitive hash index of MinHash signatures for finding near-duplicate documents"""
+
+    def __init__(self, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def add(self, key: str, signature: np.ndarray):
+        with self._lock:
+            self._signatures[key] = signature
+            for band_key in _band_keys(signature):
+                self._buckets.setdefault(band_key, set()).add(key)
+
+    def query(self, signature: np.ndarray, exclude: Iterable[str] = ()) -> Optional[Tuple[str, float]]:
+        """Return (key, similarity) of the most similar indexed signature at or above the threshold"""
+        with self._lock:
+            candidates = set()
+            for band_key in _band_keys(signature):
+                candidates.update(self._buckets.get(band_key, ()))
+            candidates.difference_update(exclude)
+            scored = [(estimate_similarity(signature, self._signatures[key]), key) for key in candidates]
+        best = max(scored, default=None)
+        if best is None or best[0] < self.threshold:
+            return None
+        return best[1], best[0]
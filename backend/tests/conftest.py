@@ -0,0 +1,29 @@
+import os
+import pytest
+from _pytest.tmpdir import TempPathFactory
+
+# Keep the suite offline: ai_service falls back to mock generations without a key
+os.environ["GEMINI_API_KEY"] = ""
+# The lowest bcrypt cost, so logins don't dominate the suite's run time
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+def pytest_configure(config):
+    # Runs before test modules are collected, so every module that reads these paths at import
+    # sees a fresh database and generation cache instead of the tracked lesson_converter.db
+    data_dir = TempPathFactory.from_config(config, _ispytest=True).mktemp("data")
+    os.environ["DATABASE_URL"] = str(data_dir / "lesson_converter.db")
+    os.environ["GENERATION_CACHE_PATH"] = str(data_dir / "generation_cache.db")
+
+    from database import init_db
+
+    # TestClient doesn't run startup handlers unless used as a context manager
+    init_db()
+
+@pytest.fixture
+def auth_headers():
+    # Imported here because the app reads DATABASE_URL at import, after pytest_configure has set it
+    from fastapi.testclient import TestClient
+    from app import app
+
+    response = TestClient(app).post("/token", json={"email": "user@example.com", "password": "password123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
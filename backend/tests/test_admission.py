@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import admission
+from admission import AdmissionController
+from app import app
+
+client = TestClient(app)
+
+def test_user_budget_returns_429_with_retry_after():
+    controller = AdmissionController(user_requests_per_minute=6, user_burst=2)
+
+    async def run():
+        for _ in range(2):
+            await controller.acquire("a@example.com", "ask")
+            controller.release("a@example.com")
+        with pytest.raises(HTTPException) as rejected:
+            await controller.acquire("a@example.com", "ask")
+        # Other users keep their own budget
+        await controller.acquire("b@example.com", "ask")
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "10"
+
+def test_cheap_requests_jump_the_queue():
+    controller = AdmissionController(max_concurrent=1, user_max_concurrent=0)
+    order = []
+
+    async def request(user, kind):
+        await controller.acquire(user, kind)
+        order.append(kind)
+
+    async def run():
+        await controller.acquire("busy@example.com", "export")
+        waiting = [asyncio.create_task(request("a@example.com", "export")), asyncio.create_task(request("b@example.com", "ask"))]
+        await asyncio.sleep(0)
+        controller.release("busy@example.com")
+        await asyncio.sleep(0)
+        controller.release("b@example.com")
+        await asyncio.gather(*waiting)
+
+    asyncio.run(run())
+    assert order == ["ask", "export"]
+
+def test_saturation_sheds_load_with_503():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.05, user_max_concurrent=0)
+
+    async def run():
+        await controller.acquire("a@example.com", "ask")
+        queued = asyncio.create_task(controller.acquire("b@example.com", "ask"))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as full:
+            await controller.acquire("c@example.com", "ask")
+        with pytest.raises(HTTPException) as timed_out:
+            await queued
+        return full.value, timed_out.value
+
+    full, timed_out = asyncio.run(run())
+    assert full.status_code == timed_out.status_code == 503
+    assert "Retry-After" in full.headers
+
+def test_endpoints_reject_users_over_their_quota(monkeypatch):
+    monkeypatch.setattr(admission, "admission_controller", AdmissionController(user_requests_per_minute=1, user_burst=2))
+    response = client.post("/token", json={"email": "user@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    client.post("/upload", headers=headers, files={"file": ("notes.txt", b"Cells are the unit of life.", "text/plain")})
+    assert client.post("/ask", headers=headers, json={"question": "What?"}).status_code == 200
+    response = client.post("/export_pdf", headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+def test_batches_are_charged_per_document(monkeypatch):
+    monkeypatch.setattr(admission, "admission_controller", AdmissionController(user_requests_per_minute=1, user_burst=7))
+    response = client.post("/token", json={"email": "user@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    files = [("files", (f"{i}.txt", f"Document {i} about cells.".encode(), "text/plain")) for i in range(3)]
+    response = client.post("/batch?exports=false", headers=headers, files=files)
+    assert [line for line in response.text.splitlines() if '"done"' in line]
+    # One unit for the request and two for each document's summary and quiz use the whole burst
+    assert client.post("/ask", headers=headers, json={"question": "What?"}).status_code == 429
+
+def test_job_generations_are_charged_when_queued(monkeypatch):
+    monkeypatch.setattr(admission, "admission_controller", AdmissionController(user_requests_per_minute=1, user_burst=3))
+    response = client.post("/token", json={"email": "user@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    client.post("/upload", headers=headers, files={"file": ("notes.txt", b"Cells divide by mitosis.", "text/plain")})
+    # Two units to admit the request and one for the quiz the worker will generate
+    assert client.post("/jobs/quiz", headers=headers).status_code == 200
+    assert client.post("/ask", headers=headers, json={"question": "What?"}).status_code == 429
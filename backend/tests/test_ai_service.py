@@ -0,0 +1,150 @@
+import json
+import ai_service
+from cache_service import GenerationCache
+
+class StubModel:
+    def __init__(self, text):
+        self.text = text
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return self
+
+def lesson_json(include_deck=False):
+    data = {
+        "summary": [f"Point {i}" for i in range(5)],
+        "quiz": [
+            {"question": f"Question {i}?", "options": ["w", "x", "y", "z"], "correct_answer": "B"}
+            for i in range(15)
+        ],
+        "flashcards": [{"front": f"Term {i}", "back": f"Meaning {i}"} for i in range(10)],
+    }
+    if include_deck:
+        data["deck"] = [{"title": "Intro", "bullets": ["a", "b", "c"]}]
+    return "```json\n" + json.dumps(data) + "\n```"
+
+def test_generate_lesson_uses_single_call(tmp_path, monkeypatch):
+    model = StubModel(lesson_json(include_deck=True))
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    lesson = ai_service.generate_lesson("Lesson text", include_deck=True)
+    assert len(model.prompts) == 1
+    assert lesson["summary"][0] == "Point 0"
+    assert len(lesson["quiz"]) == 15
+    assert lesson["quiz"][0].correct_answer == "x"
+    assert lesson["flashcards"][9].back == "Meaning 9"
+    assert lesson["deck"][0].title == "Intro"
+
+class StreamingStubModel:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        return [type("Chunk", (), {"text": text})() for text in self.chunks]
+
+def test_stream_summary_passes_chunks_through_and_caches(tmp_path, monkeypatch):
+    model = StreamingStubModel(["- first\n", "- second\n"])
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    assert list(ai_service.stream_summary("Lesson text")) == ["- first\n", "- second\n"]
+    assert list(ai_service.stream_summary("Lesson text")) == ["- first\n- second\n"]
+    assert ai_service.generate_summary("Lesson text") == ["first", "second"]
+    assert model.calls == 1
+
+def quiz_items(start, stop):
+    return [
+        {"question": f"Question {i}?", "options": ["w", "x", "y", "z"], "correct_answer": "C"}
+        for i in range(start, stop)
+    ]
+
+class SequenceStubModel:
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return type("Response", (), {"text": self.texts[len(self.prompts) - 1]})()
+
+def test_parse_quiz_recovers_partial_json():
+    text = "Here you go:\n```json\n" + json.dumps(quiz_items(0, 3))[:-1] + ', {"question": "Cut off'
+    questions = ai_service._parse_quiz(text)
+    assert [q.question for q in questions] == ["Question 0?", "Question 1?", "Question 2?"]
+    assert questions[0].correct_answer == "y"
+
+def test_parse_quiz_falls_back_to_line_layout():
+    text = "1. What is H2O?\na) Salt\nb) Water\nc) Air\nd) Fire\nAnswer: B\n\nQ: Next?\nA) 1\nB) 2\nC) 3\nD) 4\nCorrect: D"
+    questions = ai_service._parse_quiz(text)
+    assert [(q.question, q.correct_answer) for q in questions] == [("What is H2O?", "Water"), ("Next?", "4")]
+
+def test_short_quiz_gets_a_targeted_follow_up_instead_of_filler(tmp_path, monkeypatch):
+    model = SequenceStubModel([json.dumps(quiz_items(0, 12)), json.dumps(quiz_items(11, 16))])
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    quiz = ai_service.generate_quiz("Lesson text")
+    assert [q.question for q in quiz] == [f"Question {i}?" for i in range(15)]
+    assert len(model.prompts) == 2
+    assert model.prompts[1].startswith("Create 3 more")
+    assert "- Question 11?" in model.prompts[1]
+
+def test_near_duplicates_reuse_cached_generations_of_their_source(tmp_path, monkeypatch):
+    model = SequenceStubModel(["- From the source", "- From the copy"])
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    assert ai_service.generate_summary("Source text") == ["From the source"]
+    ai_service.reuse_generations_from("Copied text", "Source text")
+    assert ai_service.generate_summary("Copied text") == ["From the source"]
+    ai_service.reuse_generations_from("Copied text", "Copied text")
+    assert ai_service.generate_summary("Copied text") == ["From the copy"]
+    assert len(model.prompts) == 2
+
+def test_short_lesson_quiz_is_topped_up(tmp_path, monkeypatch):
+    lesson = {"summary": ["Point"], "quiz": quiz_items(0, 12), "flashcards": []}
+    model = SequenceStubModel([json.dumps(lesson), json.dumps(quiz_items(12, 15))])
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    result = ai_service.generate_lesson("Lesson text")
+    assert [q.question for q in result["quiz"]] == [f"Question {i}?" for i in range(15)]
+    assert model.prompts[1].startswith("Create 3 more")
+
+def test_flashcards_are_parsed_from_the_response_and_deduplicated(tmp_path, monkeypatch):
+    cards = [
+        {"front": "Photosynthesis", "back": "Turning light into chemical energy."},
+        {"front": "What is photosynthesis?", "back": "Light to sugar."},
+        {"front": "Chlorophyll", "back": "The green pigment that absorbs light."},
+    ]
+    model = StubModel("```json\n" + json.dumps(cards) + "\n```")
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    flashcards = ai_service.generate_flashcards("Plants make sugar from light.")
+    assert [card.front for card in flashcards] == ["Photosynthesis", "Chlorophyll"]
+    assert "Plants make sugar from light." in model.prompts[0]
+
+def test_flashcard_dedupe_handles_non_latin_fronts():
+    cards = [
+        ai_service.Flashcard(front="光合作用", back="Photosynthesis"),
+        ai_service.Flashcard(front="光合作用", back="Duplicate"),
+        ai_service.Flashcard(front="प्रकाश संश्लेषण", back="Photosynthesis"),
+        ai_service.Flashcard(front="What is?", back="Only filler words"),
+    ]
+    assert [card.back for card in ai_service._dedupe_flashcards(cards)] == [
+        "Photosynthesis", "Photosynthesis", "Only filler words"
+    ]
+
+def test_unparseable_responses_are_not_cached(tmp_path, monkeypatch):
+    model = SequenceStubModel(["Sorry, I can't help with that.", "Still no quiz.", json.dumps(quiz_items(0, 15))])
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    assert ai_service.generate_quiz("Lesson text")[0].question.startswith("Gemini quiz error")
+    assert len(ai_service.generate_quiz("Lesson text")) == 15
+    assert model.prompts[2] == model.prompts[0]
+
+def test_parse_flashcards_falls_back_to_line_layout():
+    text = "**Term:** Mitosis\n**Definition:** Cell division.\n\nTerm: Osmosis\nDefinition: Water crossing a membrane."
+    cards = ai_service._parse_flashcards(text)
+    assert [(card.front, card.back) for card in cards] == [
+        ("Mitosis", "Cell division."), ("Osmosis", "Water crossing a membrane.")
+    ]
@@ -1,3 +1,4 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
 from app import app
@@ -30,3 +31,93 @@ def test_logout():
     response = client.post("/logout")
     assert response.status_code == 200
     assert response.json()["message"] == "Logged out successfully. Please clear your token on the frontend."
+
+def test_exports_reuse_generated_artifacts(monkeypatch, auth_headers):
+    import ai_service
+    calls = {"summary": 0, "quiz": 0}
+    real_summary, real_quiz = ai_service.generate_summary, ai_service.generate_quiz
+
+    def counting_summary(content):
+        calls["summary"] += 1
+        return real_summary(content)
+
+    def counting_quiz(content):
+        calls["quiz"] += 1
+        return real_quiz(content)
+
+    monkeypatch.setattr(ai_service, "generate_summary", counting_summary)
+    monkeypatch.setattr(ai_service, "generate_quiz", counting_quiz)
+    client.post("/upload", headers=auth_headers, files={"file": ("notes.txt", b"Cells are the unit of life.", "text/plain")})
+    assert client.post("/summarize", headers=auth_headers).status_code == 200
+    assert client.post("/export_ppt", headers=auth_headers).status_code == 200
+    assert client.post("/export_pdf", headers=auth_headers).status_code == 200
+    assert calls == {"summary": 1, "quiz": 1}
+
+def test_generate_lesson_returns_all_artifacts(auth_headers):
+    client.post("/upload", headers=auth_headers, files={"file": ("notes.txt", b"Atoms form molecules.", "text/plain")})
+    response = client.post("/generate_lesson?include_deck=true", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["summary"]["summary"]) == 5
+    assert len(data["quiz"]["quiz"]) == 15
+    assert data["flashcards"] and data["deck"]
+
+def test_flashcards_are_generated_once_per_document(monkeypatch, auth_headers):
+    import uuid
+    import ai_service
+    calls = []
+    real_flashcards = ai_service.generate_flashcards
+
+    def counting_flashcards(content):
+        calls.append(content)
+        return real_flashcards(content)
+
+    monkeypatch.setattr(ai_service, "generate_flashcards", counting_flashcards)
+    text = f"Enzymes speed up reactions. {uuid.uuid4()}".encode()
+    client.post("/upload", headers=auth_headers, files={"file": ("enzymes.txt", text, "text/plain")})
+    first = client.post("/generate_flashcards", headers=auth_headers)
+    second = client.post("/generate_flashcards", headers=auth_headers)
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    assert len(calls) == 1
+
+def test_streaming_endpoints_send_server_sent_events(auth_headers):
+    client.post("/upload", headers=auth_headers, files={"file": ("notes.txt", b"Plants need light.", "text/plain")})
+    response = client.post("/ask/stream", headers=auth_headers, json={"question": "What do plants need?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.count("data: ") > 2
+    assert response.text.endswith("event: done\ndata: {}\n\n")
+    response = client.post("/summarize/stream", headers=auth_headers)
+    assert "Key concept 1" in response.text
+
+def test_failed_streams_end_with_an_error_event(monkeypatch, auth_headers):
+    import app as app_module
+    from fastapi import HTTPException
+
+    async def stalled(*args, **kwargs):
+        yield "Plants"
+        raise HTTPException(status_code=504, detail="AI generation timed out. Please try again.")
+
+    monkeypatch.setattr(app_module, "astream_answer", stalled)
+    client.post("/upload", headers=auth_headers, files={"file": ("notes.txt", b"Plants need light.", "text/plain")})
+    response = client.post("/ask/stream", headers=auth_headers, json={"question": "What do plants need?"})
+    assert "event: error" in response.text
+    assert "event: done" not in response.text
+
+def test_model_failing_mid_stream_ends_with_an_error_event(monkeypatch, auth_headers):
+    import ai_service
+
+    class FailingStreamModel:
+        def generate_content(self, prompt, **kwargs):
+            def chunks():
+                yield type("Chunk", (), {"text": "Plants "})()
+                raise RuntimeError("upstream 500")
+            return chunks()
+
+    monkeypatch.setattr(ai_service, "gemini_model", FailingStreamModel())
+    client.post("/upload", headers=auth_headers, files={"file": ("notes.txt", b"Plants need light.", "text/plain")})
+    response = client.post("/ask/stream", headers=auth_headers, json={"question": "What do plants need?"})
+    assert 'data: {"text": "Plants "}' in response.text
+    assert "upstream 500" not in response.text
+    assert response.text.endswith("event: error\ndata: " + json.dumps({"detail": "AI generation failed. Please try again.", "status": 500}) + "\n\n")
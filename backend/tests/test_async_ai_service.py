@@ -0,0 +1,75 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from async_ai_service import run_ai_call
+
+def slow_call(delay):
+    time.sleep(delay)
+    return delay
+
+def test_run_ai_call_returns_result():
+    assert asyncio.run(run_ai_call(slow_call, 0.01)) == 0.01
+
+def test_run_ai_call_times_out():
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(run_ai_call(slow_call, 0.5, timeout=0.05))
+    assert exc_info.value.status_code == 504
+
+def test_run_ai_call_keeps_event_loop_responsive():
+    async def scenario():
+        started = time.perf_counter()
+        call = asyncio.ensure_future(run_ai_call(slow_call, 0.3))
+        await asyncio.sleep(0.01)
+        ticked = time.perf_counter() - started
+        await call
+        return ticked
+
+    assert asyncio.run(scenario()) < 0.2
+
+def test_run_ai_call_cancels_on_client_disconnect():
+    class DisconnectedRequest:
+        async def is_disconnected(self):
+            return True
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(run_ai_call(slow_call, 0.5, request=DisconnectedRequest()))
+    assert exc_info.value.status_code == 499
+
+def test_stalled_stream_raises_instead_of_ending(monkeypatch):
+    import async_ai_service
+    monkeypatch.setattr(async_ai_service, "STREAM_KEEPALIVE_SECONDS", 0.05)
+
+    def stalled():
+        yield "partial"
+        time.sleep(0.5)
+        yield "never sent"
+
+    async def consume():
+        received = []
+        with pytest.raises(HTTPException) as exc_info:
+            async for chunk in async_ai_service.astream_ai_call(stalled, timeout=0.1):
+                received.append(chunk)
+        return received, exc_info.value
+
+    received, error = asyncio.run(consume())
+    assert received[0] == "partial"
+    assert error.status_code == 504
+
+def test_large_documents_get_a_timeout_per_round_of_map_calls(tmp_path, monkeypatch):
+    import ai_service
+    import async_ai_service
+    from cache_service import GenerationCache
+
+    class SlowModel:
+        def generate_content(self, prompt, **kwargs):
+            time.sleep(0.05)
+            return type("Response", (), {"text": "- Point"})()
+
+    monkeypatch.setattr(ai_service, "gemini_model", SlowModel())
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    monkeypatch.setattr(ai_service, "needs_chunking", lambda text: True)
+    monkeypatch.setattr(ai_service, "split_into_chunks", lambda text: [f"chunk {i}" for i in range(4 * ai_service.MAP_CONCURRENCY)])
+    # Five rounds of 0.05s calls (four map, one reduce) would overrun a single 0.15s call timeout
+    monkeypatch.setattr(async_ai_service, "AI_CALL_TIMEOUT_SECONDS", 0.15)
+    assert asyncio.run(async_ai_service.agenerate_summary("big document")) == ["Point"]
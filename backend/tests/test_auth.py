@@ -0,0 +1,44 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+import auth
+
+def credentials_for(claims):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=auth.create_access_token(claims))
+
+def counting_lookup(monkeypatch, user):
+    calls = []
+
+    def lookup(email):
+        calls.append(email)
+        return user
+
+    monkeypatch.setattr(auth, "get_user_by_email", lookup)
+    return calls
+
+def test_verified_principal_is_cached_until_password_change(monkeypatch):
+    calls = counting_lookup(monkeypatch, {"id": 7, "email": "cache@example.com"})
+    monkeypatch.setattr(auth, "_db_update_user_password", lambda email, password_hash: None)
+    auth.invalidate_principal("cache@example.com")
+    creds = credentials_for({"sub": "cache@example.com", "uid": 7})
+    assert auth.verify_token(creds) == {"email": "cache@example.com", "user_id": 7}
+    assert auth.verify_token(creds) == {"email": "cache@example.com", "user_id": 7}
+    assert len(calls) == 1
+    auth.update_user_password("cache@example.com", "new-hash")
+    auth.verify_token(creds)
+    assert len(calls) == 2
+
+def test_cached_principal_expires(monkeypatch):
+    calls = counting_lookup(monkeypatch, {"id": 8, "email": "ttl@example.com"})
+    monkeypatch.setattr(auth, "PRINCIPAL_CACHE_TTL_SECONDS", -1)
+    creds = credentials_for({"sub": "ttl@example.com", "uid": 8})
+    auth.verify_token(creds)
+    auth.verify_token(creds)
+    assert len(calls) == 2
+
+def test_token_for_replaced_account_is_rejected(monkeypatch):
+    counting_lookup(monkeypatch, {"id": 9, "email": "replaced@example.com"})
+    auth.invalidate_principal("replaced@example.com")
+    with pytest.raises(HTTPException) as exc_info:
+        auth.verify_token(credentials_for({"sub": "replaced@example.com", "uid": 3}))
+    assert exc_info.value.status_code == 401
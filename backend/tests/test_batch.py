@@ -0,0 +1,57 @@
+import io
+import json
+import zipfile
+from fastapi.testclient import TestClient
+from app import app
+from batch_cli import main as batch_cli_main
+from rate_limit import TokenBucket
+
+client = TestClient(app)
+
+def make_zip(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def test_batch_streams_a_result_per_document_and_dedupes(auth_headers):
+    archive = make_zip({
+        "week1/cells.txt": "Cells are the basic unit of life.",
+        "week2/cells-copy.txt": "Cells are the basic unit of life.",
+        "week3/notes.md": "Mitochondria produce energy.",
+        "week3/image.png": b"\x89PNG",
+    })
+    response = client.post(
+        "/batch", headers=auth_headers,
+        files=[
+            ("files", ("course.zip", archive, "application/zip")),
+            ("files", ("extra.bin", b"\x00\x01", "application/x-unknown")),
+        ],
+    )
+    assert response.status_code == 200
+    results = {r["filename"]: r for r in map(json.loads, response.text.strip().splitlines())}
+    assert set(results) == {"week1/cells.txt", "week2/cells-copy.txt", "week3/notes.md", "extra.bin"}
+    assert results["extra.bin"]["status"] == "failed"
+    first, copy = results["week1/cells.txt"], results["week2/cells-copy.txt"]
+    assert first["status"] == copy["status"] == "done"
+    assert copy["duplicate_of"] == "week1/cells.txt"
+    assert copy["document_id"] == first["document_id"]
+    assert len(first["quiz"]) == 15
+    assert set(first["export_jobs"]) == {"export_ppt", "export_pdf"}
+    assert results["week3/notes.md"]["document_id"] != first["document_id"]
+
+def test_batch_cli_writes_outputs(tmp_path):
+    archive = tmp_path / "course.zip"
+    archive.write_bytes(make_zip({"a.txt": "Plants photosynthesize.", "b.txt": "Plants photosynthesize."}))
+    out = tmp_path / "out"
+    assert batch_cli_main([str(archive), "--out", str(out)]) == 0
+    for name in ("a.txt", "b.txt"):
+        assert (out / name / "lesson.pdf").read_bytes().startswith(b"%PDF")
+        assert len(json.loads((out / name / "quiz.json").read_text())["quiz"]) == 15
+
+def test_token_bucket_reports_wait_when_empty():
+    bucket = TokenBucket(rate_per_second=10, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert 0 < bucket.try_acquire() <= 0.1
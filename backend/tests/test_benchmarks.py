@@ -0,0 +1,21 @@
+import asyncio
+from benchmarks.run_benchmarks import compare, percentile, run_suite
+
+def test_percentile_interpolates():
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([], 95) == 0.0
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {"summarize@8": {"p95_ms": 100.0, "throughput_rps": 50.0, "errors": 0}}
+    within = {"summarize@8": {"p95_ms": 110.0, "throughput_rps": 45.0, "errors": 0}}
+    worse = {"summarize@8": {"p95_ms": 130.0, "throughput_rps": 30.0, "errors": 2}}
+    assert compare(within, baseline, 0.15) == []
+    assert len(compare(worse, baseline, 0.15)) == 3
+
+def test_run_suite_against_stub():
+    results = asyncio.run(run_suite(["token", "summarize"], [2], 4, latency_ms=1, jitter_ms=0))
+    assert set(results) == {"token@2", "summarize@2"}
+    for result in results.values():
+        assert result["errors"] == 0
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+        assert result["throughput_rps"] > 0
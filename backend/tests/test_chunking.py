@@ -0,0 +1,89 @@
+import threading
+import ai_service
+from cache_service import GenerationCache
+from chunking import split_sections, split_into_chunks, needs_chunking
+
+def test_split_sections_on_pages_headings_and_blank_lines():
+    text = "Intro line\nmore intro\fPage two\n\n# Heading\nBody text"
+    assert split_sections(text) == ["Intro line\nmore intro", "Page two", "# Heading\nBody text"]
+
+def test_split_into_chunks_respects_budget():
+    text = "\n\n".join(f"Paragraph {i}. " + "word " * 50 for i in range(100))
+    chunks = split_into_chunks(text, token_budget=200)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 800 for chunk in chunks)
+    assert "Paragraph 99." in chunks[-1]
+
+def test_oversized_section_is_split():
+    chunks = split_into_chunks("x" * 2000, token_budget=100)
+    assert [len(chunk) for chunk in chunks] == [400] * 5
+    assert needs_chunking("x" * 2000, token_budget=100)
+
+class ChunkStubModel:
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        if prompt.startswith("Create"):
+            text = "".join(
+                f"Q: Question {n}-{i}?\nA) a\nB) b\nC) c\nD) d\nCorrect: C\n" for i in range(3)
+            )
+        else:
+            text = "\n".join(f"- Point {n}-{i}" for i in range(5))
+        return type("Response", (), {"text": text})()
+
+def test_large_document_is_map_reduced(tmp_path, monkeypatch):
+    model = ChunkStubModel()
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    monkeypatch.setattr(ai_service, "needs_chunking", lambda text: True)
+    monkeypatch.setattr(ai_service, "split_into_chunks", lambda text: [f"chunk {i}" for i in range(8)])
+    summary = ai_service.generate_summary("big document")
+    assert len(summary) == 5
+    assert model.calls == 9  # 8 map calls + 1 reduce call
+    quiz = ai_service.generate_quiz("big document")
+    assert len(quiz) == 15
+    assert len({q.question for q in quiz}) == 15
+    assert all(q.correct_answer == "c" for q in quiz)
+
+def test_many_chunks_only_map_the_chunks_the_quiz_uses(tmp_path, monkeypatch):
+    model = ChunkStubModel()
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    monkeypatch.setattr(ai_service, "needs_chunking", lambda text: True)
+    monkeypatch.setattr(ai_service, "split_into_chunks", lambda text: [f"chunk {i}" for i in range(40)])
+    quiz = ai_service.generate_quiz("big document")
+    assert model.calls == 15
+    # One question from every mapped chunk
+    assert len({q.question.split("-")[0] for q in quiz}) == 15
+    assert ai_service._spread_chunks([f"chunk {i}" for i in range(40)], 10)[-1] == "chunk 36"
+
+def test_editing_a_section_only_changes_nearby_chunks():
+    paragraphs = [f"Paragraph {i} covers topic {i * 7}." for i in range(300)]
+    original = split_into_chunks("\n\n".join(paragraphs), token_budget=400)
+    paragraphs[150] = "A rewritten paragraph about something else entirely."
+    edited = split_into_chunks("\n\n".join(paragraphs), token_budget=400)
+    assert len(set(edited) - set(original)) <= 2
+    assert len(original) > 10
+
+def test_reupload_regenerates_only_changed_chunks(tmp_path, monkeypatch):
+    model = ChunkStubModel()
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    monkeypatch.setattr(ai_service, "needs_chunking", lambda text: True)
+    monkeypatch.setattr(ai_service, "split_into_chunks", lambda text: split_into_chunks(text, token_budget=400))
+    slides = [f"Slide {i}: the water cycle, stage {i * 3}." for i in range(300)]
+    ai_service.generate_summary("\f".join(slides))
+    ai_service.generate_quiz("\f".join(slides))
+    first_run = model.calls
+    slides[120] = "Slide 120 was rewritten to cover condensation instead."
+    model.calls = 0
+    ai_service.generate_summary("\f".join(slides))
+    ai_service.generate_quiz("\f".join(slides))
+    # At most two changed chunks per artifact plus the summary reduce step
+    assert model.calls <= 5
+    assert first_run > 20
@@ -0,0 +1,58 @@
+import threading
+from database import close_all_connections, get_db_connection, get_user_by_email
+
+def test_connection_is_reused_within_a_thread():
+    with get_db_connection() as first:
+        pass
+    with get_db_connection() as second:
+        pass
+    assert first is second
+
+def test_each_thread_gets_its_own_tuned_connection():
+    seen = {}
+
+    def worker():
+        with get_db_connection() as conn:
+            seen["conn"] = conn
+            seen["journal_mode"] = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            seen["synchronous"] = conn.execute("PRAGMA synchronous").fetchone()[0]
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    with get_db_connection() as conn:
+        assert seen["conn"] is not conn
+    assert seen["journal_mode"] == "wal"
+    assert seen["synchronous"] == 1  # NORMAL
+
+def test_helpers_work_through_the_pool():
+    assert get_user_by_email("user@example.com")["email"] == "user@example.com"
+
+def test_threads_reconnect_after_the_pool_is_closed():
+    ready, closed, done = threading.Event(), threading.Event(), {}
+
+    def worker():
+        get_user_by_email("user@example.com")
+        ready.set()
+        closed.wait()
+        done["user"] = get_user_by_email("user@example.com")
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    ready.wait()
+    close_all_connections()
+    closed.set()
+    thread.join()
+    assert done["user"]["email"] == "user@example.com"
+
+def test_connections_close_when_their_thread_exits():
+    import gc
+    import database
+    before = len(database._connections)
+    threads = [threading.Thread(target=get_user_by_email, args=("user@example.com",)) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gc.collect()
+    assert len(database._connections) <= before
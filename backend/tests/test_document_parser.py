@@ -0,0 +1,48 @@
+import io
+from fastapi.testclient import TestClient
+import document_parser
+from app import app
+from export_service import create_pdf, create_powerpoint
+from models import QuizQuestion
+
+client = TestClient(app)
+
+def sample_quiz(n):
+    return [QuizQuestion(question=f"Question {i}", options=["a", "b", "c", "d"], correct_answer="a") for i in range(n)]
+
+def test_pdf_pages_are_extracted_across_tasks(monkeypatch, auth_headers):
+    monkeypatch.setattr(document_parser, "PDF_PAGES_PER_TASK", 2)
+    pdf_bytes = create_pdf(["Summary point"], sample_quiz(40))
+    response = client.post("/upload", headers=auth_headers, files={"file": ("lesson.pdf", pdf_bytes, "application/pdf")})
+    assert response.status_code == 200
+    assert "AI Lesson Converter" in response.json()["content"]
+
+def test_pptx_and_docx_uploads_are_extracted(auth_headers):
+    from docx import Document
+    pptx_bytes = create_powerpoint(["Slide summary point"], sample_quiz(2))
+    response = client.post("/upload", headers=auth_headers, files={"file": ("lesson.pptx", pptx_bytes, document_parser.PPTX_TYPE)})
+    assert "Slide summary point" in response.json()["content"]
+    doc = Document()
+    doc.add_paragraph("Paragraph about volcanoes")
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    response = client.post("/upload", headers=auth_headers, files={"file": ("lesson.docx", buffer.getvalue(), document_parser.DOCX_TYPE)})
+    assert response.json()["content"] == "Paragraph about volcanoes\n"
+
+def test_upload_size_cap(monkeypatch, auth_headers):
+    monkeypatch.setattr(document_parser, "MAX_UPLOAD_BYTES", 10)
+    response = client.post("/upload", headers=auth_headers, files={"file": ("big.txt", b"x" * 100, "text/plain")})
+    assert response.status_code == 413
+
+def test_declared_oversized_upload_is_refused_before_reading(monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(document_parser, "MAX_UPLOAD_BYTES", 10)
+    monkeypatch.setattr(app_module, "MULTIPART_OVERHEAD_BYTES", 0)
+    # Refused from Content-Length alone, before the body would be parsed or the token checked
+    response = client.post("/upload", files={"file": ("big.txt", b"x" * 100, "text/plain")})
+    assert response.status_code == 413
+
+def test_corrupt_pdf_is_rejected(auth_headers):
+    response = client.post("/upload", headers=auth_headers, files={"file": ("bad.pdf", b"not a pdf", "application/pdf")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Failed to parse PDF file."
@@ -0,0 +1,72 @@
+import uuid
+from fastapi.testclient import TestClient
+from app import app
+from document_store import DocumentStore
+
+client = TestClient(app)
+
+def test_documents_survive_a_cold_cache():
+    writer = DocumentStore()
+    document_id = writer.save("store@example.com", "notes.txt", "Compressed lesson text " * 100)
+    reader = DocumentStore()  # simulates another worker with an empty cache
+    assert reader.load("store@example.com", document_id) == (document_id, "Compressed lesson text " * 100)
+    assert reader.load("store@example.com") == (document_id, "Compressed lesson text " * 100)
+    assert reader.load("someone-else@example.com", document_id) is None
+
+def test_cache_is_bounded():
+    store = DocumentStore(max_entries=2, max_bytes=1000)
+    ids = [store.save("store@example.com", f"{i}.txt", f"document {i}") for i in range(3)]
+    assert list(store._cache) == ids[1:]
+    store.save("store@example.com", "big.txt", "x" * 2000)
+    assert len(store._cache) == 2
+    assert store.load("store@example.com", ids[0]) == (ids[0], "document 0")
+
+def test_users_can_address_several_documents(auth_headers):
+    first = client.post("/upload", headers=auth_headers, files={"file": ("a.txt", b"First document", "text/plain")}).json()
+    second = client.post("/upload", headers=auth_headers, files={"file": ("b.txt", b"Second document", "text/plain")}).json()
+    listed = [doc["document_id"] for doc in client.get("/documents", headers=auth_headers).json()]
+    assert listed[:2] == [second["document_id"], first["document_id"]]
+    response = client.post(f"/ask?document_id={first['document_id']}", headers=auth_headers, json={"question": "Which?"})
+    assert response.status_code == 200
+    assert client.post("/summarize?document_id=missing", headers=auth_headers).status_code == 404
+
+def test_reupload_reports_changed_sections(auth_headers):
+    filename = f"cycle-{uuid.uuid4().hex}.txt"
+    pages = [f"Page {i} about the nitrogen cycle." for i in range(5)]
+    first = client.post("/upload", headers=auth_headers, files={"file": (filename, "\f".join(pages).encode(), "text/plain")}).json()
+    assert first["previous_document_id"] is None
+    pages[3] = "Page 3 now covers denitrification."
+    second = client.post("/upload", headers=auth_headers, files={"file": (filename, "\f".join(pages).encode(), "text/plain")}).json()
+    assert second["previous_document_id"] == first["document_id"]
+    assert (second["changed_sections"], second["removed_sections"], second["total_sections"]) == (1, 1, 5)
+
+def test_near_duplicate_uploads_reuse_the_earlier_document():
+    seed = uuid.uuid4().hex
+    text = " ".join(f"{seed[i % 32]}{i} lesson" for i in range(400))
+    copied = "Cover page\n\n" + text.replace(" ", "\n", 20)
+    store = DocumentStore()
+    original = store.save("store@example.com", "handout.pdf", text)
+    copy = store.save("classmate@example.com", "handout.docx", copied)
+    assert store.load_source("classmate@example.com", copy) == (copy, copied, text)
+    assert store.near_duplicate_similarity(copy) >= 0.85
+    assert store.load_source("store@example.com", original) == (original, text, text)
+    assert store.load_source("classmate@example.com", original) is None
+
+def test_edited_reupload_is_summarized_from_its_new_text(tmp_path, monkeypatch, auth_headers):
+    import ai_service
+    from cache_service import GenerationCache
+
+    class EchoModel:
+        def generate_content(self, prompt, **kwargs):
+            return type("Response", (), {"text": "- " + ("denitrification" if "denitrification" in prompt else "nitrification")})()
+
+    monkeypatch.setattr(ai_service, "gemini_model", EchoModel())
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    filename = f"cycle-{uuid.uuid4().hex}.txt"
+    words = [f"{uuid.uuid4().hex[:6]}{i} nitrification" for i in range(400)]
+    first = client.post("/upload", headers=auth_headers, files={"file": (filename, " ".join(words).encode(), "text/plain")}).json()
+    assert client.post(f"/summarize?document_id={first['document_id']}", headers=auth_headers).json()["summary"] == ["nitrification"]
+    words[200] = "denitrification"
+    second = client.post("/upload", headers=auth_headers, files={"file": (filename, " ".join(words).encode(), "text/plain")}).json()
+    assert second["near_duplicate_similarity"] is None
+    assert client.post(f"/summarize?document_id={second['document_id']}", headers=auth_headers).json()["summary"] == ["denitrification"]
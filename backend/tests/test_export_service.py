@@ -0,0 +1,62 @@
+import asyncio
+import io
+from pptx import Presentation
+import export_service
+from export_service import RenderCache, iter_chunks, render_export, render_key
+from models import QuizQuestion
+
+def sample_quiz(n):
+    return [QuizQuestion(question=f"Question {i}?", options=["a", "b", "c", "d"], correct_answer="a") for i in range(n)]
+
+def test_render_cache_evicts_by_entries_and_bytes():
+    cache = RenderCache(max_entries=2, max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.get("a")
+    cache.put("c", b"1234")
+    assert cache.get("b") is None and cache.get("a") == b"1234"
+    cache.put("d", b"12345678")
+    assert list(cache._cache) == ["d"]
+
+def test_render_key_depends_on_content():
+    assert render_key("pdf", ["x"], sample_quiz(1)) == render_key("pdf", ["x"], sample_quiz(1))
+    assert render_key("pdf", ["x"], sample_quiz(1)) != render_key("pptx", ["x"], sample_quiz(1))
+    assert render_key("pdf", ["x"], sample_quiz(1)) != render_key("pdf", ["y"], sample_quiz(1))
+
+def test_concurrent_identical_exports_render_once(monkeypatch):
+    monkeypatch.setattr(export_service, "render_cache", RenderCache())
+    calls = []
+    original = export_service._get_process_pool
+
+    def counting_pool():
+        calls.append(1)
+        return original()
+    monkeypatch.setattr(export_service, "_get_process_pool", counting_pool)
+
+    async def export_twice():
+        return await asyncio.gather(*[render_export("pptx", ["Point"], sample_quiz(3)) for _ in range(4)])
+    results = asyncio.run(export_twice())
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+    assert Presentation(io.BytesIO(results[0])).slides[0].shapes.title.text == "AI Lesson Converter"
+    asyncio.run(render_export("pptx", ["Point"], sample_quiz(3)))
+    assert len(calls) == 1
+
+def test_iter_chunks_round_trips():
+    data = bytes(range(256)) * 1000
+    assert b"".join(iter_chunks(data, chunk_size=1000)) == data
+
+def test_large_quiz_is_paginated_across_slides():
+    deck = Presentation(io.BytesIO(export_service.create_powerpoint(["Point"], sample_quiz(250), questions_per_slide=4)))
+    quiz_slides = list(deck.slides)[2:]
+    assert len(quiz_slides) == 63
+    assert quiz_slides[0].shapes.title.text == "Quiz Questions (1/63)"
+    first_page = [p.text for p in quiz_slides[0].placeholders[1].text_frame.paragraphs]
+    assert [line for line in first_page if line.startswith("Q")] == [f"Q{i + 1}: Question {i}?" for i in range(4)]
+    assert quiz_slides[-1].placeholders[1].text_frame.paragraphs[0].text == "Q249: Question 248?"
+
+def test_quiz_slides_can_be_built_from_an_iterator():
+    deck = Presentation(io.BytesIO(export_service.create_powerpoint(["Point"], iter(sample_quiz(7)), questions_per_slide=3)))
+    assert [slide.shapes.title.text for slide in deck.slides][2:] == [
+        "Quiz Questions (1)", "Quiz Questions (2)", "Quiz Questions (3)"
+    ]
@@ -0,0 +1,45 @@
+import time
+import ai_service
+from cache_service import GenerationCache, make_cache_key
+
+class StubModel:
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        return self
+
+def test_cache_key_normalizes_whitespace():
+    key_a = make_cache_key("Photosynthesis  converts\nlight", "tpl", "model")
+    key_b = make_cache_key(" Photosynthesis converts light ", "tpl", "model")
+    assert key_a == key_b
+    assert key_a != make_cache_key("Photosynthesis converts light", "tpl", "other-model")
+
+def test_cache_hit_miss_and_lru_eviction(tmp_path):
+    cache = GenerationCache(path=str(tmp_path / "cache.db"), ttl_seconds=60, max_entries=2)
+    assert cache.get("a") is None
+    cache.set("a", "1")
+    cache.set("b", "2")
+    time.sleep(0.01)
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+    assert cache.stats() == {"hits": 2, "misses": 2, "evictions": 1}
+
+def test_cache_ttl_expiry(tmp_path):
+    cache = GenerationCache(path=str(tmp_path / "cache.db"), ttl_seconds=0, max_entries=10)
+    cache.set("a", "1")
+    time.sleep(0.01)
+    assert cache.get("a") is None
+
+def test_generate_summary_reuses_cached_generation(tmp_path, monkeypatch):
+    model = StubModel("- one\n- two\n- three")
+    monkeypatch.setattr(ai_service, "gemini_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(path=str(tmp_path / "cache.db")))
+    first = ai_service.generate_summary("Same handout text")
+    second = ai_service.generate_summary("Same   handout text")
+    assert first == second == ["one", "two", "three"]
+    assert model.calls == 1
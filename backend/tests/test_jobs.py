@@ -0,0 +1,96 @@
+import time
+from fastapi.testclient import TestClient
+import job_queue
+from app import app
+
+client = TestClient(app)
+
+def wait_for_job(job_id, headers, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+def test_export_job_runs_in_background_and_returns_result(auth_headers):
+    client.post("/upload", headers=auth_headers, files={"file": ("notes.txt", b"Rivers erode valleys.", "text/plain")})
+    response = client.post("/jobs/export_pdf", headers=auth_headers)
+    assert response.status_code == 200
+    job = wait_for_job(response.json()["job_id"], auth_headers)
+    assert job["status"] == "done"
+    result = client.get(f"/jobs/{job['job_id']}/result", headers=auth_headers)
+    assert result.headers["content-type"] == "application/pdf"
+    assert result.content.startswith(b"%PDF")
+
+def test_identical_in_flight_jobs_are_deduplicated(monkeypatch, auth_headers):
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "quiz", lambda payload: (time.sleep(0.3), (b"[]", "application/json"))[1])
+    client.post("/upload", headers=auth_headers, files={"file": ("notes.txt", b"Dedup me.", "text/plain")})
+    first = client.post("/jobs/quiz", headers=auth_headers).json()["job_id"]
+    second = client.post("/jobs/quiz", headers=auth_headers).json()["job_id"]
+    assert first == second
+    assert wait_for_job(first, auth_headers)["status"] == "done"
+
+def test_failed_jobs_are_retried(monkeypatch, auth_headers):
+    attempts = []
+
+    def flaky(payload):
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise RuntimeError("renderer crashed")
+        return b"ok", "text/plain"
+
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "export_ppt", flaky)
+    monkeypatch.setattr(job_queue, "JOB_RETRY_BACKOFF_SECONDS", 0)
+    client.post("/upload", headers=auth_headers, files={"file": ("notes.txt", b"Retry me.", "text/plain")})
+    job_id = client.post("/jobs/export_ppt", headers=auth_headers).json()["job_id"]
+    job = wait_for_job(job_id, auth_headers)
+    assert job["status"] == "done" and job["attempts"] == 2
+
+def test_only_one_worker_claims_a_job():
+    from database import create_job, claim_job, get_job
+    create_job("claim-job", "user@example.com", "quiz", "claim-key", "{}")
+    assert claim_job("claim-job", "worker-a", time.time() + 60)
+    assert not claim_job("claim-job", "worker-b", time.time() + 60)
+    assert get_job("claim-job")["owner"] == "worker-a"
+
+def test_recovery_only_requeues_expired_leases(monkeypatch):
+    from database import create_job, claim_job, get_job, update_job_status
+    monkeypatch.setattr(job_queue, "_enqueue", lambda *args: None)
+    create_job("live-job", "user@example.com", "quiz", "live-key", "{}")
+    create_job("dead-job", "user@example.com", "quiz", "dead-key", "{}")
+    claim_job("live-job", "sibling", time.time() + 60)
+    claim_job("dead-job", "crashed", time.time() - 1)
+    job_queue.recover_jobs()
+    assert get_job("live-job")["status"] == "running"
+    assert get_job("dead-job")["status"] == "queued"
+    update_job_status("dead-job", "failed")
+
+def test_recovery_watches_leases_even_with_nothing_queued(monkeypatch):
+    from database import create_job, claim_job, get_job, update_job_status
+    monkeypatch.setattr(job_queue, "_maintenance", None)
+    monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", 0.05)
+    monkeypatch.setattr(job_queue, "_enqueue", lambda *args: None)
+    create_job("orphan-job", "user@example.com", "quiz", "orphan-key", "{}")
+    claim_job("orphan-job", "dead-sibling", time.time() + 0.2)
+    job_queue.recover_jobs()
+    assert get_job("orphan-job")["status"] == "running"
+    deadline = time.time() + 5
+    while get_job("orphan-job")["status"] == "running" and time.time() < deadline:
+        time.sleep(0.05)
+    assert get_job("orphan-job")["status"] == "queued"
+    update_job_status("orphan-job", "failed")
+
+def test_finished_jobs_are_pruned_after_their_ttl():
+    from database import create_job, save_job_result, get_job, get_db_connection, delete_finished_jobs
+    create_job("old-job", "user@example.com", "quiz", "old-key", "{}")
+    save_job_result("old-job", b"[]", "application/json")
+    with get_db_connection() as conn:
+        conn.execute("UPDATE jobs SET updated_at = datetime('now', '-2 days') WHERE id = 'old-job'")
+        conn.commit()
+    create_job("new-job", "user@example.com", "quiz", "new-key", "{}")
+    save_job_result("new-job", b"[]", "application/json")
+    delete_finished_jobs(24 * 3600)
+    assert get_job("old-job") is None
+    assert get_job("new-job") is not None
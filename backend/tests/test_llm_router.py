@@ -0,0 +1,72 @@
+import threading
+import time
+import pytest
+from llm_router import Backend, CircuitBreaker, LLMRouter, NoBackendAvailable
+
+class StubBackend:
+    def __init__(self, text, delay=0.0, fail=False):
+        self.text = text
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.text} is down")
+        response = type("Response", (), {"text": self.text})()
+        return [response] if stream else response
+
+def test_slow_call_is_hedged_to_the_next_backend():
+    slow, fast = StubBackend("slow", delay=0.5), StubBackend("fast")
+    router = LLMRouter([Backend("slow", slow), Backend("fast", fast)], hedge_default_seconds=0.05)
+    started = time.perf_counter()
+    assert router.generate_content("prompt").text == "fast"
+    assert time.perf_counter() - started < 0.4
+    assert (slow.calls, fast.calls) == (1, 1)
+
+def test_hedges_are_capped_to_a_fraction_of_calls():
+    slow = StubBackend("slow", delay=0.1)
+    router = LLMRouter([Backend("slow", slow)], hedge_default_seconds=0.01, hedge_max_fraction=0.1)
+    for _ in range(3):
+        assert router.generate_content("prompt").text == "slow"
+    assert slow.calls == 4
+
+def test_failures_fail_over_and_open_the_breaker():
+    broken, backup = StubBackend("broken", fail=True), StubBackend("backup")
+    router = LLMRouter([
+        Backend("broken", broken, CircuitBreaker(failure_threshold=2, reset_seconds=60)), Backend("backup", backup)
+    ])
+    for _ in range(3):
+        assert router.generate_content("prompt").text == "backup"
+    # The third call skips the broken backend without waiting on it
+    assert (broken.calls, backup.calls) == (2, 3)
+    assert router.backends[0].breaker.state == "open"
+
+def test_open_breaker_lets_one_trial_through_after_reset():
+    flaky = StubBackend("flaky", fail=True)
+    backend = Backend("flaky", flaky, CircuitBreaker(failure_threshold=1, reset_seconds=0.05))
+    router = LLMRouter([backend])
+    with pytest.raises(RuntimeError):
+        router.generate_content("prompt")
+    with pytest.raises(NoBackendAvailable):
+        router.generate_content("prompt")
+    time.sleep(0.06)
+    flaky.fail = False
+    assert router.generate_content("prompt").text == "flaky"
+    assert backend.breaker.state == "closed"
+
+def test_stream_fails_over_before_the_first_chunk():
+    router = LLMRouter([Backend("broken", StubBackend("broken", fail=True)), Backend("backup", StubBackend("backup"))])
+    assert [chunk.text for chunk in router.generate_content("prompt", stream=True)] == ["backup"]
+
+def test_backends_track_their_own_latency():
+    backend = Backend("stub", StubBackend("ok", delay=0.001))
+    router = LLMRouter([backend])
+    assert backend.latency_percentile(95) is None
+    for _ in range(20):
+        router.generate_content("prompt")
+    assert 0.001 <= backend.latency_percentile(95) < 0.1
@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+from app import app
+from metrics import Histogram, server_timing_header, LLM_MOCK_FALLBACKS, UPLOAD_PARSE_SECONDS
+
+client = TestClient(app)
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5, stage="a")
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="a"} 3' in lines
+
+def test_server_timing_header_sums_repeated_stages():
+    header = server_timing_header([("llm", 0.1), ("db", 0.002), ("llm", 0.2)], 0.5)
+    assert header == "llm;dur=300.0, db;dur=2.0, total;dur=500.0"
+
+def test_requests_report_stage_timings_and_metrics():
+    response = client.post("/token", json={"email": "user@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    parsed_before = UPLOAD_PARSE_SECONDS.count(format="text")
+    mocks_before = LLM_MOCK_FALLBACKS.value(operation="summary", reason="no_model")
+
+    response = client.post("/upload", headers=headers, files={"file": ("notes.txt", b"Cells divide.", "text/plain")})
+    assert "parse;dur=" in response.headers["Server-Timing"]
+    assert "total;dur=" in response.headers["Server-Timing"]
+    assert UPLOAD_PARSE_SECONDS.count(format="text") == parsed_before + 1
+
+    client.post("/summarize", headers=headers, params={"document_id": response.json()["document_id"]})
+    assert LLM_MOCK_FALLBACKS.value(operation="summary", reason="no_model") == mocks_before + 1
+
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="POST",route="/upload",status="200"}' in body
+    assert "db_call_duration_seconds_bucket" in body
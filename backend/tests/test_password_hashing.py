@@ -0,0 +1,34 @@
+import hashlib
+import uuid
+from fastapi.testclient import TestClient
+import password_hashing
+from app import app
+from database import create_user, get_user_by_email
+
+client = TestClient(app)
+
+def test_legacy_sha256_hash_is_upgraded_on_verify():
+    legacy = hashlib.sha256(b"hunter22").hexdigest()
+    valid, upgraded = password_hashing.verify_password("hunter22", legacy)
+    assert valid and upgraded.startswith("$2b$")
+    assert password_hashing.verify_password("hunter22", upgraded) == (True, None)
+    assert password_hashing.verify_password("wrong", legacy) == (False, None)
+    assert password_hashing.verify_password("hunter22", None) == (False, None)
+
+def test_hashes_below_the_current_cost_are_upgraded(monkeypatch):
+    old = password_hashing.hash_password("p" * 100)
+    monkeypatch.setattr(password_hashing, "_rounds", password_hashing.current_rounds() + 1)
+    valid, upgraded = password_hashing.verify_password("p" * 100, old)
+    assert valid and upgraded.split("$")[2] == f"{password_hashing.current_rounds():02d}"
+
+def test_calibration_stays_within_bounds():
+    assert password_hashing.calibrate_rounds(0.000001) == password_hashing.BCRYPT_MIN_ROUNDS
+    assert password_hashing.calibrate_rounds(10 ** 6) == password_hashing.BCRYPT_MAX_ROUNDS
+
+def test_login_migrates_legacy_hashes():
+    email = f"legacy-{uuid.uuid4().hex}@example.com"
+    create_user(email, hashlib.sha256(b"password123").hexdigest())
+    assert client.post("/token", json={"email": email, "password": "password123"}).status_code == 200
+    assert get_user_by_email(email)["password_hash"].startswith("$2b$")
+    assert client.post("/token", json={"email": email, "password": "password123"}).status_code == 200
+    assert client.post("/token", json={"email": email, "password": "nope"}).status_code == 401
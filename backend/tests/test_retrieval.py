@@ -0,0 +1,33 @@
+from retrieval import BM25Index, build_question_context, tokenize
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("What is the Krebs cycle?") == ["krebs", "cycle"]
+
+def test_bm25_ranks_relevant_passage_first():
+    index = BM25Index([
+        "Mitochondria produce ATP through cellular respiration.",
+        "The French Revolution began in 1789.",
+        "Photosynthesis in chloroplasts converts light into chemical energy.",
+    ])
+    assert index.search("Where is light converted by photosynthesis?", top_k=1) == [
+        "Photosynthesis in chloroplasts converts light into chemical energy."
+    ]
+
+def test_question_context_only_sends_relevant_passages():
+    filler = "\n\n".join(f"Chapter {i} discusses unrelated history of trade routes." for i in range(400))
+    text = filler + "\n\nThe mitochondria is the powerhouse of the cell.\n\n" + filler
+    context = build_question_context("doc-1", text, "What is the powerhouse of the cell?", top_k=2)
+    assert "powerhouse" in context
+    assert len(context) < len(text) / 10
+
+def test_small_documents_are_sent_whole():
+    assert build_question_context("doc-2", "Short notes.", "anything") == "Short notes."
+
+def test_non_latin_passages_are_ranked_by_the_question():
+    index = BM25Index([
+        "История Рима начинается с основания города.",
+        "Митохондрии производят энергию для клетки.",
+        "线粒体为细胞产生能量。",
+    ])
+    assert index.search("Что производят митохондрии?", top_k=1) == ["Митохондрии производят энергию для клетки."]
+    assert index.search("线粒体产生什么？", top_k=1) == ["线粒体为细胞产生能量。"]
@@ -0,0 +1,33 @@
+import random
+from similarity import MinHashIndex, estimate_similarity, minhash_signature
+
+def handout(seed, words=600):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+def test_signatures_estimate_shingle_overlap():
+    text = handout(1)
+    reformatted = "COVER PAGE\f" + text.upper().replace(" ", "\n", 50)
+    assert estimate_similarity(minhash_signature(text), minhash_signature(reformatted)) > 0.9
+    assert estimate_similarity(minhash_signature(text), minhash_signature(handout(2))) < 0.1
+    assert minhash_signature("   ...   ") is None
+
+def test_index_returns_best_match_above_threshold():
+    index = MinHashIndex(threshold=0.8)
+    original = handout(3)
+    index.add("original", minhash_signature(original))
+    index.add("other", minhash_signature(handout(4)))
+    edited = original.replace(original.split()[10], "changed", 1)
+    key, similarity = index.query(minhash_signature(edited))
+    assert key == "original" and similarity >= 0.8
+    assert index.query(minhash_signature(handout(5))) is None
+
+def test_non_latin_documents_are_signed_and_matched():
+    rng = random.Random(5)
+    russian = " ".join(rng.choice(["клетка", "энергия", "митохондрии", "белок", "ядро", "мембрана"]) + str(i) for i in range(300))
+    chinese = "".join(rng.choice("线粒体细胞能量蛋白质核膜光合作用") for _ in range(600))
+    for text in (russian, chinese):
+        assert minhash_signature(text) is not None
+        edited = "封面\f" + text
+        assert estimate_similarity(minhash_signature(text), minhash_signature(edited)) > 0.9
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+import app
+
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", "1.5"))
+# Loaded on first use or by the startup warm-up, never by importing the app
+DEFERRED_MODULES = ("google.generativeai", "reportlab", "pptx", "PyPDF2", "docx", "scipy")
+
+def test_importing_the_app_stays_within_budget():
+    code = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        "import app\n"
+        "print(time.perf_counter() - started)\n"
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))\n"
+    )
+    # A key is set so a model created at import would show up as google.generativeai being loaded
+    env = dict(os.environ, GEMINI_API_KEY="test-key", WARM_UP_ON_STARTUP="false")
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, capture_output=True, text=True, check=True
+    )
+    elapsed, loaded = result.stdout.split("\n")[-3:-1]
+    assert loaded == ""
+    assert float(elapsed) < IMPORT_TIME_BUDGET_SECONDS
+
+def test_warm_up_loads_deferred_modules(monkeypatch):
+    monkeypatch.setattr(app.document_parser, "warm_up", lambda: None)
+    app.warm_up()
+    assert "reportlab" in sys.modules and "pptx" in sys.modules
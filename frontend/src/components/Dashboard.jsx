@@ -8,6 +8,7 @@ function Dashboard() {
   const [uploadMessage, setUploadMessage] = useState("");
   const [summary, setSummary] = useState([]);
   const [quiz, setQuiz] = useState([]);
+  const [lesson, setLesson] = useState(null);
   const [question, setQuestion] = useState("");
   const [answer, setAnswer] = useState("");
   const [loading, setLoading] = useState(false);
@@ -27,6 +28,9 @@ function Dashboard() {
     try {
       const res = await api.uploadFile(file);
       setUploadMessage(res.message);
+      setLesson(null);
+      setSummary([]);
+      setQuiz([]);
       setLoading(false);
     } catch (err) {
       setLoading(false);
@@ -34,12 +38,20 @@ function Dashboard() {
     }
   };
 
+  // One /generate_lesson call returns the summary and quiz together; both buttons share it
+  const loadLesson = async () => {
+    if (lesson) return lesson;
+    const res = await api.generateLesson();
+    setLesson(res);
+    return res;
+  };
+
   const handleSummarize = async () => {
     setLoading(true);
     setError("");
     try {
-      const res = await api.summarize();
-      setSummary(res.summary);
+      const res = await loadLesson();
+      setSummary(res.summary.summary);
       setLoading(false);
     } catch (err) {
       setLoading(false);
@@ -51,8 +63,8 @@ function Dashboard() {
     setLoading(true);
     setError("");
     try {
-      const res = await api.generateQuiz();
-      setQuiz(res.quiz);
+      const res = await loadLesson();
+      setQuiz(res.quiz.quiz);
       setLoading(false);
     } catch (err) {
       setLoading(false);
@@ -93,6 +93,20 @@ class ApiService {
     return response.json();
   }
 
+  async generateLesson(includeDeck = false) {
+    const response = await fetch(`${this.baseURL}/generate_lesson?include_deck=${includeDeck}`, {
+      method: 'POST',
+      headers: this.getAuthHeaders(),
+    });
+
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || 'Lesson generation failed');
+    }
+
+    return response.json();
+  }
+
   async askQuestion(question) {
     const response = await fetch(`${this.baseURL}/ask`, {
       method: 'POST',